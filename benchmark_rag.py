@@ -0,0 +1,381 @@
+"""
+Offline performance benchmark for RAG Recipe Assistant.
+
+Runs without OpenAI or Weaviate: embeddings and chat are deterministic fakes, and the
+vector store is the in-process LocalVectorDb. Synthetic corpora are generated from the
+recipes.json templates.
+
+Measured per corpus size:
+- ingestion throughput (recipes/s) and index flush time
+- vector search latency p50/p95/p99 and QPS (single, batched and filtered queries)
+- BM25 search latency (the lexical half of hybrid retrieval)
+- index memory and process RSS
+- RagApp startup time (cold rebuild and warm restart) and end-to-end answer latency
+
+Results are written as JSON tagged with the git commit, so runs can be diffed.
+
+Usage:
+  python benchmark_rag.py
+  python benchmark_rag.py --sizes 1000,10000,100000,1000000 --out bench.json
+  python benchmark_rag.py --compare bench_main.json --out bench.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import re
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from dataclasses import asdict, replace
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from src.config import Settings
+from src.context_packer import ContextPacker
+from src.filters import MetadataFilter
+from src.lexical import LexicalIndex
+from src.llm import StreamedAnswer
+from src.local_vector_db import LocalVectorDb
+from src.rag_app import RagApp
+from src.recipes_loader import load_recipes
+from src.tracing import percentile
+
+# RagApp settings that change what an answer does, pinned so .env / environment overrides
+# cannot skew the numbers; recorded in the report's config.
+APP_SETTINGS = {
+    "index_mode": "recipe",
+    "retrieval_mode": "vector",
+    "reranker": "none",
+    "matryoshka_dims": 0,
+    "vector_quantization": "none",
+    "quantization_rescore": 0,
+    "relevance_max_distance": 0.0,
+    "max_context_tokens": 0,
+}
+
+QUESTIONS = [
+    "How long should I simmer the tomato sauce?",
+    "What can I cook with chicken and rice?",
+    "Quick vegetarian breakfast ideas",
+    "How do I bake salmon with lemon?",
+    "Which recipes use soy sauce and sesame oil?",
+    "How many eggs do I need for the omelette?",
+    "What soup can I make in under 30 minutes?",
+    "How do I make overnight oats?",
+]
+
+ADJECTIVES = ["Smoky", "Zesty", "Rustic", "Creamy", "Spicy", "Herby", "Crispy", "Golden", "Garlicky", "Tangy"]
+EXTRAS = ["chili flakes", "lime zest", "fresh parsley", "toasted sesame", "smoked paprika", "spring onion",
+          "grated ginger", "cherry tomatoes", "baby spinach", "feta cheese", "roasted peppers", "honey"]
+
+# ------------------ FAKES ------------------
+
+class FakeEmbedder:
+    """Deterministic pseudo-random unit vectors keyed by text; no semantic meaning, constant cost."""
+    model = "fake"
+
+    def __init__(self, dims: int) -> None:
+        self.dims = dims
+
+    def _vector(self, text: str) -> np.ndarray:
+        return np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(self.dims, dtype=np.float32)
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+class FakeChat:
+    """Answers instantly with the first line of context; same surface as OpenAIChatClient."""
+
+    def __init__(self, model: str = "gpt-4o-mini") -> None:
+        self.packer = ContextPacker(model)
+
+    def rag_answer(self, context, question, trace=None) -> str:
+        return self.packer.pack_text(context).text.split("\n", 1)[0]
+
+    def rag_answer_stream(self, context, question, started=None, trace=None) -> StreamedAnswer:
+        return StreamedAnswer(iter([self.rag_answer(context, question)]), started=started)
+
+# ------------------ CORPUS ------------------
+
+def synthetic_recipes(templates: List[dict], n: int, seed: int = 0) -> List[dict]:
+    """n recipes cycling through the templates, each with a distinct title and one extra ingredient."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        t = templates[i % len(templates)]
+        extra = rng.choice(EXTRAS)
+        content = re.sub(r"(Ingredients:\n)", rf"\1- 1 tbsp {extra}\n", t["content"], count=1)
+        out.append({
+            **t,
+            "id": f"s{i}",
+            "title": f"{rng.choice(ADJECTIVES)} {t['title']} No. {i}",
+            "content": content,
+        })
+    return out
+
+# ------------------ MEASUREMENT ------------------
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    scale = 2**20 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+def latency_stats(samples: List[float]) -> Dict[str, float]:
+    values = sorted(samples)
+    total = sum(values)
+    return {
+        "n": len(values),
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "mean_ms": statistics.fmean(values) * 1000 if values else 0.0,
+        "qps": len(values) / total if total else 0.0,
+    }
+
+def time_each(fn: Callable, args: List) -> List[float]:
+    samples = []
+    for a in args:
+        t0 = time.perf_counter()
+        fn(a)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+# ------------------ BENCHMARKS ------------------
+
+def bench_index(recipes: List[dict], embedder: FakeEmbedder, queries: int, k: int,
+                batch: int, workdir: Path, lexical_max: int, dtype: str = "float32") -> Dict:
+    def to_notes(chunk: List[dict]) -> List[dict]:
+        return [
+            {
+                "note_id": r["id"], "title": r["title"], "content": r["content"], "content_hash": "",
+                "tags": r.get("tags", []), "protein_source": r.get("protein_source", ""),
+                "meal_type": r.get("meal_type", []),
+            }
+            for r in chunk
+        ]
+
+    rss_before = rss_mb()
+    db = LocalVectorDb(str(workdir / "index"), "Bench", recreate=True, dtype=dtype)
+    # Embed and insert one batch at a time: at 1M x 1536 the whole corpus's vectors won't fit in RAM.
+    embed_s = insert_s = 0.0
+    for start in range(0, len(recipes), batch):
+        chunk = recipes[start:start + batch]
+        notes = to_notes(chunk)
+        t0 = time.perf_counter()
+        vectors = embedder.embed_texts([f"{r['title']}\n{r['content']}" for r in chunk])
+        embed_s += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        db.insert(notes, vectors)
+        insert_s += time.perf_counter() - t0
+    del notes, vectors
+    t0 = time.perf_counter()
+    db.flush()
+    flush_s = time.perf_counter() - t0
+
+    qvecs = [embedder.embed_query(f"{QUESTIONS[i % len(QUESTIONS)]} #{i}") for i in range(queries)]
+    dinner = [MetadataFilter("meal_type", "dinner")]
+    single = time_each(lambda q: db.search(q, k=k), qvecs)
+    filtered = time_each(lambda q: db.search(q, k=k, filters=dinner), qvecs)
+    block = 32
+    t0 = time.perf_counter()
+    for start in range(0, len(qvecs), block):
+        db.search_many(qvecs[start:start + block], k=k)
+    batched_s = time.perf_counter() - t0
+
+    result = {
+        "embed_s": embed_s,
+        "ingest": {
+            "insert_s": insert_s,
+            "flush_s": flush_s,
+            "recipes_per_s": len(recipes) / insert_s if insert_s else 0.0,
+        },
+        "search": latency_stats(single),
+        "search_filtered": latency_stats(filtered),
+        "search_batched": {"block": block, "qps": len(qvecs) / batched_s if batched_s else 0.0},
+        "memory": {
+            "index_mb": db.index_bytes / 2**20,
+            "index_file_mb": sum(p.stat().st_blocks * 512 for p in (workdir / "index").glob("Bench.*vec")) / 2**20,
+            "rss_delta_mb": rss_mb() - rss_before,
+        },
+    }
+
+    if len(recipes) <= lexical_max:
+        lexical = LexicalIndex()
+        notes = to_notes(recipes)
+        t0 = time.perf_counter()
+        lexical.upsert(notes)
+        lexical.search("warmup", k)  # the index is built lazily on first search
+        build_s = time.perf_counter() - t0
+        words = [f"{QUESTIONS[i % len(QUESTIONS)]}" for i in range(queries)]
+        result["lexical"] = {"build_s": build_s, **latency_stats(time_each(lambda q: lexical.search(q, k), words))}
+    return result
+
+def bench_app(recipes: List[dict], embedder: FakeEmbedder, queries: int, k: int, workdir: Path) -> Dict:
+    recipes_path = workdir / "recipes.json"
+    recipes_path.write_text(json.dumps(recipes, ensure_ascii=False), encoding="utf-8")
+    settings = replace(
+        Settings(),
+        **APP_SETTINGS,
+        recipes_path=str(recipes_path),
+        vector_backend="local",
+        local_index_dir=str(workdir / "app_index"),
+        ingredients_path=str(workdir / "app_index" / "ingredients.json"),
+        embedding_cache_path="",
+        answer_cache_size=0,
+        trace_jsonl_path="",
+        ingest_checkpoint_path="",
+    )
+
+    t0 = time.perf_counter()
+    app = RagApp(replace(settings, ingest_mode="rebuild"), embedder=embedder, llm=FakeChat())
+    cold_s = time.perf_counter() - t0
+    app.close()
+
+    # Warm start: the persisted index is memory-mapped and every content hash matches.
+    t0 = time.perf_counter()
+    app = RagApp(replace(settings, ingest_mode="sync"), embedder=embedder, llm=FakeChat())
+    warm_s = time.perf_counter() - t0
+
+    samples = time_each(lambda q: app.answer(q, k=k), [f"{QUESTIONS[i % len(QUESTIONS)]} ({i})" for i in range(queries)])
+    stages = {
+        name: {q: v * 1000 for q, v in stats.items() if q in ("p50", "p95", "p99")}
+        for name, stats in app.metrics.percentiles().items()
+    }
+    app.close()
+    return {
+        "startup_cold_s": cold_s,
+        "startup_warm_s": warm_s,
+        "answer": latency_stats(samples),
+        "answer_stages_ms": stages,
+    }
+
+# ------------------ REPORTING ------------------
+
+def git_info() -> Dict[str, Optional[str]]:
+    def git(*args) -> Optional[str]:
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(status) if status is not None else None}
+
+# (path in results, higher is better)
+COMPARED = [
+    (("ingest", "recipes_per_s"), True),
+    (("search", "p50_ms"), False),
+    (("search", "p99_ms"), False),
+    (("search", "qps"), True),
+    (("search_filtered", "p50_ms"), False),
+    (("search_batched", "qps"), True),
+    (("lexical", "p50_ms"), False),
+    (("memory", "index_mb"), False),
+    (("app", "startup_warm_s"), False),
+    (("app", "answer", "p50_ms"), False),
+]
+
+def _dig(d: dict, path) -> Optional[float]:
+    for key in path:
+        if not isinstance(d, dict) or key not in d:
+            return None
+        d = d[key]
+    return d
+
+def compare(old: dict, new: dict, tolerance: float) -> List[str]:
+    """Human-readable diff of the headline metrics; lines starting with '!' are regressions."""
+    lines = []
+    old_by_size = {r["size"]: r for r in old.get("results", [])}
+    for res in new["results"]:
+        base = old_by_size.get(res["size"])
+        if base is None:
+            continue
+        for path, higher_is_better in COMPARED:
+            a, b = _dig(base, path), _dig(res, path)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = change < -tolerance if higher_is_better else change > tolerance
+            lines.append(f"{'!' if worse else ' '} size={res['size']:<8} {'.'.join(path):<24} {a:12.3f} -> {b:12.3f} ({change:+.1%})")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline RAG performance benchmark")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated corpus sizes")
+    parser.add_argument("--dims", type=int, default=1536, help="fake embedding dimensions")
+    parser.add_argument("--queries", type=int, default=200, help="queries per measurement")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=1000, help="ingest batch size")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16", "int8"], help="local index storage")
+    parser.add_argument("--lexical-max", type=int, default=100_000, help="skip BM25 above this corpus size")
+    parser.add_argument("--app-max", type=int, default=10_000, help="skip RagApp benchmarks above this corpus size")
+    parser.add_argument("--recipes", default="recipes.json", help="template recipes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", help="previous JSON results to diff against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative change flagged as regression")
+    args = parser.parse_args()
+
+    templates = [asdict(r) for r in load_recipes(args.recipes)]
+    for t in templates:
+        t["tags"], t["meal_type"] = list(t["tags"]), list(t["meal_type"])
+    embedder = FakeEmbedder(args.dims)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    report = {
+        **git_info(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "config": {**vars(args), "app_settings": APP_SETTINGS},
+        "results": [],
+    }
+
+    for size in sizes:
+        recipes = synthetic_recipes(templates, size, seed=args.seed)
+        workdir = Path(tempfile.mkdtemp(prefix="rag_bench_"))
+        try:
+            print(f"[bench] size={size}: index ...", file=sys.stderr)
+            res = {"size": size, **bench_index(recipes, embedder, args.queries, args.k, args.batch, workdir, args.lexical_max, args.dtype)}
+            if size <= args.app_max:
+                print(f"[bench] size={size}: RagApp ...", file=sys.stderr)
+                res["app"] = bench_app(recipes, embedder, args.queries, args.k, workdir)
+            res["peak_rss_mb"] = peak_rss_mb()
+            report["results"].append(res)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    out = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(out + "\n", encoding="utf-8")
+        print(f"[bench] wrote {args.out}", file=sys.stderr)
+    else:
+        print(out)
+
+    if args.compare:
+        old = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print(f"\n=== vs {old.get('commit') or args.compare} ===", file=sys.stderr)
+        for line in compare(old, report, args.tolerance):
+            print(line, file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -16,18 +16,25 @@ Usage:
   python evaluate_rag.py
   python evaluate_rag.py --runs 3
   python evaluate_rag.py --k 1 --runs 3
+  python evaluate_rag.py --runs 3 --workers 16 --reuse
+  python evaluate_rag.py --calibrate --reuse   # suggest RELEVANCE_MAX_DISTANCE
+  python evaluate_rag.py --dims 256            # Matryoshka recall vs. index size (no Weaviate needed)
+  python evaluate_rag.py --storage             # float32 / float16 / int8 recall vs. index size (no Weaviate needed)
+  python evaluate_rag.py --quantizer pq        # score retrieval against PQ-compressed collections
+  OPENAI_CASSETTE_MODE=replay python evaluate_rag.py   # offline, from recorded responses
 """
 
 import argparse
 import json
 import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple
 from dataclasses import dataclass
 
 from dotenv import load_dotenv
 import weaviate
 from weaviate.classes.config import Property, DataType, Configure
-from openai import OpenAI
 import json
 from pathlib import Path
 
@@ -39,6 +46,18 @@ WEAVIATE_HOST = "localhost"
 WEAVIATE_HTTP_PORT = 8080
 WEAVIATE_GRPC_PORT = 50051
 
+from src.cassette import openai_client
+from src.chunking import chunk_recipe
+from src.config import Settings
+from src.embeddings import OpenAIEmbeddingClient
+from src.embedding_cache import CachedEmbeddingClient, EmbeddingCache
+from src.ingest import recipe_documents
+from src.local_vector_db import LocalVectorDb
+from src.matryoshka import MatryoshkaVectorDb, truncate
+from src.recipes_loader import iter_recipes
+from src.relevance import calibrate_threshold
+from src.rerank import make_reranker
+from src.vector_db import QUANTIZERS, collection_quantizer, near_vector_many
 from src.eval_config import (
     EMBED_MODEL,
     RERANK_MODEL,
@@ -52,6 +71,95 @@ def load_recipes():
     return json.loads(Path("recipes.json").read_text(encoding="utf-8"))
 RECIPES = load_recipes()
 
+def document_texts(index_mode: str) -> List[str]:
+    """The texts RagApp embeds for `index_mode`, in RECIPES order, so eval vectors match the app's."""
+    return recipe_documents(iter_recipes("recipes.json"), index_mode)[0]
+
+# ------------------ QUERIES ------------------
+
+# FIXED EVAL SET (expand this! keep constant across all runs)
+QUERIES_RETRIEVAL = [
+    # Retrieval Benchmark
+    # Ambiguous pasta queries (should separate r1 vs r2)
+    {"query": "I have pasta and garlic. What should I cook for two?", "expected": ["r1"]},
+    {"query": "Creamy pasta with mushrooms—how do I make it?", "expected": ["r2"]},
+    {"query": "What pasta recipe uses butter and onion?", "expected": ["r2"]},
+    {"query": "Tomato pasta—what do I add after draining?", "expected": ["r1"]},
+
+    # Similar protein cooking queries (force right dish)
+    {"query": "How do I know chicken is fully cooked? What temperature?", "expected": ["r3"]},
+    {"query": "Bake fish with lemon—what temperature and time?", "expected": ["r4"]},
+
+    # Short keyword-y queries
+    {"query": "soy sauce sesame oil stir fry", "expected": ["r5"]},
+    {"query": "kidney beans ground beef spices", "expected": ["r6"]},
+    {"query": "romaine croutons parmesan chicken", "expected": ["r7"]},
+
+    # Dessert ambiguity
+    {"query": "quick chocolate cake in a cup microwave time", "expected": ["r9"]},
+    {"query": "banana breakfast batter flip when bubbles", "expected": ["r10"]},
+
+    # Edge phrasing / incomplete
+    {"query": "overnight oats: how many hours?", "expected": ["r8"]},
+
+    # Noisy queries
+    {"query": "tomato pasta garlic time simmer", "expected": ["r1"]},
+    {"query": "tommato spageti garlic simer how long", "expected": ["r1"]},
+    {"query": "сколько минут тушить томаты для пасты?", "expected": ["r1"]},
+
+    {"query": "cream mushroom pasta how much cream", "expected": ["r2"]},
+    {"query": "cremy mushrom pasta cream ml?", "expected": ["r2"]},
+    {"query": "сколько сливок в пасте с грибами?", "expected": ["r2"]},
+
+    {"query": "mug cake microwave seconds", "expected": ["r9"]},
+    {"query": "choc mug cake microwvave 45 or 60 sec", "expected": ["r9"]},
+    {"query": "сколько секунд готовить кекс в кружке?", "expected": ["r9"]},
+    {"query": "Quick beef chili: after adding tomatoes and beans, exactly how many minutes should it simmer?", "expected": ["r6"]},
+    {"query": "Overnight oats: what is the minimum chill time in hours?", "expected": ["r8"]},
+
+]
+
+QUERIES_PROJECT = [
+    # Planning Benchmark
+    {"query": "For a healthy family breakfast, how long should overnight oats chill?", "expected": ["r8"]},
+    {"query": "Low-sugar breakfast: what are the exact amounts for overnight oats?", "expected": ["r8"]},
+    {"query": "Breakfast for kids: how long do I cook banana pancakes on each side?", "expected": ["r10"]},
+    {"query": "What ingredients do I need for banana pancakes, with quantities?", "expected": ["r10"]},
+
+    {"query": "Chicken night (only once this week): what internal temperature should chicken thighs reach?", "expected": ["r3"]},
+    {"query": "Chicken thighs: how long do I sear skin-side down?", "expected": ["r3"]},
+
+    {"query": "Fish night (only once this week): what oven temperature do I bake salmon at?", "expected": ["r4"]},
+    {"query": "How many minutes do I bake salmon fillets in the oven?", "expected": ["r4"]},
+
+    {"query": "Meat-based dinner: what spices are in the quick beef chili?", "expected": ["r6"]},
+    {"query": "Quick beef chili: how long should it simmer after adding beans?", "expected": ["r6"]},
+
+    {"query": "Weeknight pasta: how long should I simmer tomatoes for simple tomato spaghetti?", "expected": ["r1"]},
+    {"query": "Creamy mushroom pasta: how many ml of cream does it use?", "expected": ["r2"]},
+    {"query": "Vegetable stir-fry: how long do I stir-fry the vegetables before adding soy sauce?", "expected": ["r5"]},
+
+    {"query": "Tomato garlic pasta: how many minutes do I simmer the tomatoes?", "expected": ["r1", "r12", "r35", "r36", "r37"]},
+    {"query": "Chocolate mug cake: should I microwave 45 seconds or 60 seconds?", "expected": ["r9", "r46", "r47", "r48"]},
+
+]
+
+# Questions the recipe corpus cannot answer; used only to calibrate the relevance gate.
+QUERIES_OFF_TOPIC = [
+    {"query": "What is the capital of Australia?"},
+    {"query": "How do I reset my router password?"},
+    {"query": "Explain the rules of offside in football."},
+    {"query": "Who wrote Pride and Prejudice?"},
+    {"query": "What is the time complexity of quicksort?"},
+    {"query": "How far is the Moon from the Earth?"},
+    {"query": "Best way to learn to play the guitar?"},
+    {"query": "How do I change a flat tyre on a bicycle?"},
+    {"query": "What are the symptoms of the flu?"},
+    {"query": "Translate 'good morning' into Japanese."},
+    {"query": "Сколько планет в Солнечной системе?"},
+    {"query": "How should I prepare for a job interview?"},
+]
+
 # ------------------ METRICS ------------------
 
 def recall_at_k(ranked_ids: List[str], expected: List[str], k: int) -> float:
@@ -75,13 +183,19 @@ def safe_improvement(enh: float, base: float) -> float:
 @dataclass
 class EvalClients:
     def __post_init__(self):
-        self.client = OpenAI()
+        settings = Settings()
+        self.client = openai_client(settings)
+        self.embedder = OpenAIEmbeddingClient(EMBED_MODEL, settings=settings)
+
+        if settings.embedding_cache_path:
+            cache = EmbeddingCache(settings.embedding_cache_path, settings.embedding_cache_max_mb * 1024 * 1024)
+            self.embedder = CachedEmbeddingClient(self.embedder, cache)
 
     def embed(self, text: str) -> List[float]:
-        return self.client.embeddings.create(
-            model=EMBED_MODEL,
-            input=[text],
-        ).data[0].embedding
+        return self.embedder.embed_query(text)
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        return self.embedder.embed_texts(texts)
 
     def rerank(self, question: str, candidates: List[Dict]) -> List[str]:
         """
@@ -106,8 +220,10 @@ class EvalClients:
             ],
         )
         txt = resp.choices[0].message.content.strip()
-        obj = json.loads(txt)
-        ranked = obj.get("ranked_ids", [])
+        try:
+            ranked = json.loads(txt).get("ranked_ids", [])
+        except (json.JSONDecodeError, AttributeError):
+            ranked = []  # malformed output: fall back to first-stage order below
 
         # Safety: filter to only known ids and keep all candidates in some order
         known = [c["note_id"] for c in candidates]
@@ -129,89 +245,116 @@ def connect_db():
         raise RuntimeError("Weaviate not ready. Is Docker running?")
     return client
 
-def recreate_collection(client, name, properties):
+# PQ codes one byte per segment of this many dimensions (16x smaller than float32).
+PQ_DIMS_PER_SEGMENT = 4
+
+def pq_segments(dims: int) -> int:
+    return dims // PQ_DIMS_PER_SEGMENT if dims % PQ_DIMS_PER_SEGMENT == 0 else dims
+
+def quantizer_config(quantizer: str, dims: int, objects: int):
+    """
+    Weaviate's PQ and SQ only train once `training_limit` objects are indexed (100k by default),
+    so on this small corpus they would stay uncompressed; train them on the corpus itself.
+    """
+    if quantizer == "pq":
+        return Configure.VectorIndex.Quantizer.pq(
+            segments=pq_segments(dims), centroids=min(256, objects), training_limit=objects
+        )
+    if quantizer == "sq":
+        return Configure.VectorIndex.Quantizer.sq(training_limit=objects)
+    return QUANTIZERS[quantizer]() if quantizer in QUANTIZERS else None
+
+def vector_bytes(quantizer: str, dims: int) -> int:
+    """Compressed bytes per stored vector (HNSW links and any rescoring originals excluded)."""
+    return {"pq": pq_segments(dims), "bq": -(-dims // 8), "sq": dims}.get(quantizer, 4 * dims)
+
+def recreate_collection(client, name, properties, quantizer: str = "none", dims: int = 0, objects: int = 0):
     if client.collections.exists(name):
         client.collections.delete(name)
     return client.collections.create(
         name=name,
         properties=properties,
-        vector_config=Configure.Vectors.self_provided(),
+        vector_config=Configure.Vectors.self_provided(quantizer=quantizer_config(quantizer, dims, objects)),
     )
 
 # ------------------ INGESTION ------------------
 
-def ingest_baseline(col, clients: EvalClients):
-    for r in RECIPES:
-        vec = clients.embed(r["title"] + "\n" + r["content"])
-        col.data.insert(
-            properties={
-                "note_id": r["id"],
-                "title": r["title"],
-                "content": r["content"],
-            },
-            vector=vec,
-        )
-
-def chunk_recipe(recipe: Dict) -> List[Tuple[str, str]]:
-    parts = recipe["content"].split("Instructions:\n", 1)
-    if len(parts) == 2:
-        before, after = parts
-        ingredients = before.strip()
-        instructions = ("Instructions:\n" + after.strip()).strip()
-    else:
-        ingredients = recipe["content"]
-        instructions = recipe["content"]
-
-    if "Ingredients:\n" in ingredients:
-        ingredients = "Ingredients:\n" + ingredients.split("Ingredients:\n", 1)[1].strip()
+def bulk_insert(col, objects: List[Dict], vectors: List[List[float]], batch_size: int = 200):
+    with col.batch.fixed_size(batch_size=batch_size) as batch:
+        for props, vec in zip(objects, vectors):
+            batch.add_object(properties=props, vector=vec)
+    if col.batch.failed_objects:
+        raise RuntimeError(f"{len(col.batch.failed_objects)} objects failed to insert into {col.name}")
 
-    return [
-        ("ingredients", ingredients),
-        ("instructions", instructions),
-    ]
+def ingest_baseline(col, clients: EvalClients):
+    objects = [{"note_id": r["id"], "title": r["title"], "content": r["content"]} for r in RECIPES]
+    bulk_insert(col, objects, clients.embed_many(document_texts("recipe")))
 
 def ingest_chunked(col, clients: EvalClients):
+    objects = []
     for r in RECIPES:
-        for section, text in chunk_recipe(r):
-            vec = clients.embed(f"{r['title']}\nsection:{section}\n{text}")
-            col.data.insert(
-                properties={
-                    "note_id": r["id"],
-                    "title": r["title"],
-                    "section": section,
-                    "content": text,
-                },
-                vector=vec,
-            )
+        for section, text in chunk_recipe(r["content"]):
+            objects.append({"note_id": r["id"], "title": r["title"], "section": section, "content": text})
+    bulk_insert(col, objects, clients.embed_many(document_texts("chunked")))
+
+BASE_PROPERTIES = [
+    Property(name="note_id", data_type=DataType.TEXT),
+    Property(name="title", data_type=DataType.TEXT),
+    Property(name="content", data_type=DataType.TEXT),
+]
+CHUNK_PROPERTIES = [
+    Property(name="note_id", data_type=DataType.TEXT),
+    Property(name="title", data_type=DataType.TEXT),
+    Property(name="section", data_type=DataType.TEXT),
+    Property(name="content", data_type=DataType.TEXT),
+]
+
+def prepare_collections(db, clients: EvalClients, reuse: bool = False, quantizer: str = "none", dims: int = 0):
+    """
+    Build both collections once per invocation; every run then queries the same data.
+    With reuse=True, collections left by a previous invocation are kept if their size and
+    quantizer match.
+    """
+    expected_chunks = sum(len(chunk_recipe(r["content"])) for r in RECIPES)
+    out = []
+    for name, props, ingest, expected in (
+        (BASE_COLLECTION, BASE_PROPERTIES, ingest_baseline, len(RECIPES)),
+        (CHUNK_COLLECTION, CHUNK_PROPERTIES, ingest_chunked, expected_chunks),
+    ):
+        if reuse and db.collections.exists(name):
+            col = db.collections.get(name)
+            if (
+                col.aggregate.over_all(total_count=True).total_count == expected
+                and collection_quantizer(col) == quantizer
+            ):
+                out.append(col)
+                continue
+        col = recreate_collection(db, name, props, quantizer, dims, expected)
+        ingest(col, clients)
+        out.append(col)
+    return tuple(out)
 
 # ------------------ RETRIEVAL ------------------
 
-def retrieve_baseline(col, qvec, limit=10) -> List[Tuple[str, str]]:
-    res = col.query.near_vector(
-        near_vector=qvec,
-        limit=limit,
-        return_metadata=["distance"],
-    )
+def retrieve_baseline(col, qvecs, limit=10) -> List[List[Tuple[str, str]]]:
     out = []
-    for obj in res.objects:
-        out.append((obj.properties["note_id"], obj.properties["content"]))
+    for res in near_vector_many(col, qvecs, limit=limit, return_metadata=["distance"]):
+        out.append([(obj.properties["note_id"], obj.properties["content"]) for obj in res.objects])
     return out
 
-def retrieve_chunked(col, qvec, limit=30):
-    res = col.query.near_vector(
-        near_vector=qvec,
-        limit=limit,
-        return_metadata=["distance"],
-    )
+def retrieve_chunked(col, qvecs, limit=30):
     out = []
-    for obj in res.objects:
-        p = obj.properties
-        out.append((
-            p["note_id"],
-            p.get("section", "full"),
-            p["content"],
-            p.get("title", "")
-        ))
+    for res in near_vector_many(col, qvecs, limit=limit, return_metadata=["distance"]):
+        hits = []
+        for obj in res.objects:
+            p = obj.properties
+            hits.append((
+                p["note_id"],
+                p.get("section", "full"),
+                p["content"],
+                p.get("title", "")
+            ))
+        out.append(hits)
     return out
 
 
@@ -260,160 +403,183 @@ def select_top_recipes_from_chunks(
 
 # ------------------ EVALUATION ------------------
 
-def run_once(queries, k: int) -> Dict[str, float]:
-    clients = EvalClients()
-    db = connect_db()
-
-    try:
-        # Baseline collection
-        base_col = recreate_collection(
-            db,
-            BASE_COLLECTION,
-            [
-                Property(name="note_id", data_type=DataType.TEXT),
-                Property(name="title", data_type=DataType.TEXT),
-                Property(name="content", data_type=DataType.TEXT),
-            ],
-        )
-        ingest_baseline(base_col, clients)
-
-        # Enhanced collection (chunked)
-        chunk_col = recreate_collection(
-            db,
-            CHUNK_COLLECTION,
-            [
-                Property(name="note_id", data_type=DataType.TEXT),
-                Property(name="title", data_type=DataType.TEXT),
-                Property(name="section", data_type=DataType.TEXT),
-                Property(name="content", data_type=DataType.TEXT),
-            ],
-        )
-        ingest_chunked(chunk_col, clients)
-
-        base_rrs, base_recalls = [], []
-        enh_rrs, enh_recalls = [], []
+def run_once(base_col, chunk_col, clients: EvalClients, ranker, queries, k: int, workers: int = 8) -> Dict[str, float]:
+    started = time.perf_counter()
 
-        for q in queries:
-            qvec = clients.embed(q["query"])
-            expected = q["expected"]
+    # Embed and search the whole query block up front instead of one round-trip per query.
+    qvecs = clients.embed_many([q["query"] for q in queries])
+    base_hits_all = retrieve_baseline(base_col, qvecs, limit=k)
+    chunk_hits_all = retrieve_chunked(chunk_col, qvecs, limit=80)
 
-            # --- Baseline ---
-            base_hits = retrieve_baseline(base_col, qvec, limit=k)
-            base_ranked_ids = [rid for rid, _ in base_hits]  # ordered
-            base_recalls.append(recall_at_k(base_ranked_ids, expected, k))
-            base_rrs.append(reciprocal_rank(base_ranked_ids, expected, k))
+    def evaluate(item) -> Tuple[float, float, float, float]:
+        q, base_hits, chunk_hits = item
+        expected = q["expected"]
 
-            # --- Enhanced: chunked retrieve + per-recipe aggregation + rerank ---
-            chunk_hits = retrieve_chunked(chunk_col, qvec, limit=80)
+        # --- Baseline ---
+        base_ranked_ids = [rid for rid, _ in base_hits]  # ordered
 
-            # Build a smaller, higher-quality candidate set for reranking
-            candidates = select_top_recipes_from_chunks(
-                chunk_hits,
-                top_recipes=12,
-                max_chars_per_recipe=1200,
-            )
+        # --- Enhanced: chunked retrieve + per-recipe aggregation + rerank ---
+        # Build a smaller, higher-quality candidate set for reranking
+        candidates = select_top_recipes_from_chunks(
+            chunk_hits,
+            top_recipes=12,
+            max_chars_per_recipe=1200,
+        )
+        if ranker is None:
+            ranked_ids = [c["note_id"] for c in candidates]
+        else:
+            ranked_ids = ranker.rerank(q["query"], candidates)
+
+        return (
+            recall_at_k(base_ranked_ids, expected, k),
+            reciprocal_rank(base_ranked_ids, expected, k),
+            recall_at_k(ranked_ids, expected, k),
+            reciprocal_rank(ranked_ids, expected, k),
+        )
 
-            ranked_ids = clients.rerank(q["query"], candidates)
+    # Reranking is the per-query bottleneck; run it on a bounded pool.
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        scores = list(pool.map(evaluate, zip(queries, base_hits_all, chunk_hits_all)))
 
-            enh_recalls.append(recall_at_k(ranked_ids, expected, k))
-            enh_rrs.append(reciprocal_rank(ranked_ids, expected, k))
+    wall = time.perf_counter() - started
+    base_recalls, base_rrs, enh_recalls, enh_rrs = zip(*scores)
+    return {
+        "baseline_recall": statistics.mean(base_recalls),
+        "baseline_mrr": statistics.mean(base_rrs),
+        "enhanced_recall": statistics.mean(enh_recalls),
+        "enhanced_mrr": statistics.mean(enh_rrs),
+        "wall_s": wall,
+        "qps": len(queries) / wall if wall > 0 else float("inf"),
+    }
 
-        b_recall = sum(base_recalls) / len(base_recalls)
-        b_mrr = sum(base_rrs) / len(base_rrs)
-        e_recall = sum(enh_recalls) / len(enh_recalls)
-        e_mrr = sum(enh_rrs) / len(enh_rrs)
+# ------------------ RELEVANCE GATE ------------------
 
-        return {
-            "baseline_recall": b_recall,
-            "baseline_mrr": b_mrr,
-            "enhanced_recall": e_recall,
-            "enhanced_mrr": e_mrr,
-        }
+def best_distances(col, qvecs) -> List[float]:
+    return [res.objects[0].metadata.distance for res in near_vector_many(col, qvecs, limit=1, return_metadata=["distance"])]
 
-    finally:
-        db.close()
+def calibrate(base_col, chunk_col, clients: EvalClients, min_recall: float) -> None:
+    """
+    Print a RELEVANCE_MAX_DISTANCE per index mode from on-topic vs off-topic best-hit distances.
+    On-topic queries whose expected recipes are not all in recipes.json are left out: the index
+    cannot answer them, so their distances would loosen the threshold.
+    """
+    known = {r["id"] for r in RECIPES}
+    on_topic = [q for q in QUERIES_RETRIEVAL + QUERIES_PROJECT if set(q["expected"]) <= known]
+    on_vecs = clients.embed_many([q["query"] for q in on_topic])
+    off_vecs = clients.embed_many([q["query"] for q in QUERIES_OFF_TOPIC])
+    skipped = len(QUERIES_RETRIEVAL) + len(QUERIES_PROJECT) - len(on_topic)
+    print(f"\n=== RELEVANCE CALIBRATION ({len(on_vecs)} on-topic, {len(off_vecs)} off-topic, "
+          f"{skipped} skipped: expected recipes missing) ===")
+    for mode, col in (("recipe", base_col), ("chunked", chunk_col)):
+        on, off = best_distances(col, on_vecs), best_distances(col, off_vecs)
+        cal = calibrate_threshold(on, off, min_recall=min_recall)
+        print(f"INDEX_MODE={mode:<8} on-topic max {max(on):.3f}   off-topic min {min(off):.3f}")
+        print(f"  RELEVANCE_MAX_DISTANCE={cal.threshold:.3f}   "
+              f"on-topic kept {cal.on_topic_kept:.0%}   off-topic refused {cal.off_topic_rejected:.0%}")
+
+# ------------------ VECTOR STORAGE ------------------
+
+def compare_storage(clients: EvalClients, queries, k: int, dims: int, rescore: int) -> None:
+    """
+    Recall, MRR and index memory for each way of storing the recipe vectors: full float32,
+    float16, int8, and (with `dims`) a Matryoshka prefix; "+ rescore" re-ranks rescore x k
+    candidates with the full float32 vectors, whose memory is counted alongside the index.
+    """
+    notes = [{"note_id": r["id"], "title": r["title"], "content": r["content"]} for r in RECIPES]
+    vecs = clients.embed_many(document_texts("recipe"))
+    qvecs = clients.embed_many([q["query"] for q in queries])
+
+    def two_stage(d: int, dtype: str) -> MatryoshkaVectorDb:
+        return MatryoshkaVectorDb(LocalVectorDb(None, "EvalCoarse", dtype=dtype), LocalVectorDb(None, "EvalFull"), d, rescore)
+
+    configs = [(f"float32 ({len(vecs[0])}d)", LocalVectorDb(None, "Eval"), 0)]
+    configs += [(dtype, LocalVectorDb(None, "Eval", dtype=dtype), 0) for dtype in ("float16", "int8")]
+    configs.append((f"int8 + rescore x{rescore}", two_stage(0, "int8"), 0))
+    if dims:
+        configs.append((f"{dims}d only", LocalVectorDb(None, "Eval"), dims))
+        configs.append((f"{dims}d + rescore x{rescore}", two_stage(dims, "float32"), 0))
+        configs.append((f"{dims}d int8 + rescore x{rescore}", two_stage(dims, "int8"), 0))
+
+    print(f"\n=== VECTOR STORAGE ({len(queries)} queries, K={k}) ===")
+    for name, db, prefix in configs:
+        # Single-stage prefix rows index (and query with) the truncated vectors directly.
+        db.insert(notes, truncate(vecs, prefix).tolist() if prefix else vecs)
+        qv = truncate(qvecs, prefix).tolist() if prefix else qvecs
+        t0 = time.perf_counter()
+        results = db.search_many(qv, k)
+        ms = (time.perf_counter() - t0) * 1000
+        ranked = [[obj.properties["note_id"] for obj in res.objects] for res in results]
+        recall = statistics.mean(recall_at_k(r, q["expected"], k) for r, q in zip(ranked, queries))
+        mrr = statistics.mean(reciprocal_rank(r, q["expected"], k) for r, q in zip(ranked, queries))
+        # Re-scoring rows also hold the full float32 copy, so they cost more than plain float32.
+        stores = [db.coarse, db.full] if isinstance(db, MatryoshkaVectorDb) else [db]
+        index_bytes = sum(store.index_bytes for store in stores)
+        print(f"{name:<28} Recall@{k}: {recall:.3f}   MRR@{k}: {mrr:.3f}   "
+              f"index: {index_bytes / 1024:.1f} KiB   search: {ms:.2f} ms")
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--runs", type=int, default=3)
     parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=8, help="queries evaluated concurrently")
+    parser.add_argument(
+        "--reuse", action="store_true",
+        help="keep collections from a previous invocation instead of re-ingesting",
+    )
+    parser.add_argument(
+        "--reranker", default="llm",
+        help="llm (default), bm25, cross-encoder, cross-encoder:<model> or none",
+    )
+    parser.add_argument(
+        "--calibrate", action="store_true",
+        help="derive RELEVANCE_MAX_DISTANCE from the eval queries instead of scoring retrieval",
+    )
+    parser.add_argument(
+        "--dims", type=int, default=0,
+        help="compare full vs. N-dimension (Matryoshka) retrieval, with and without re-scoring",
+    )
+    parser.add_argument(
+        "--storage", action="store_true",
+        help="compare float32 / float16 / int8 vector storage, with and without re-scoring",
+    )
+    parser.add_argument("--rescore", type=int, default=4, help="candidates per result re-scored with full vectors")
+    parser.add_argument(
+        "--quantizer", default="none", choices=["none", *QUANTIZERS],
+        help="Weaviate vector compression for the eval collections (re-ingests unless --reuse)",
+    )
+    parser.add_argument("--min-recall", type=float, default=1.0, help="on-topic share the gate must keep")
     args = parser.parse_args()
 
-    # FIXED EVAL SET (expand this! keep constant across all runs)
-    QUERIES_RETRIEVAL = [
-        # Retrieval Benchmark
-        # Ambiguous pasta queries (should separate r1 vs r2)
-        {"query": "I have pasta and garlic. What should I cook for two?", "expected": ["r1"]},
-        {"query": "Creamy pasta with mushrooms—how do I make it?", "expected": ["r2"]},
-        {"query": "What pasta recipe uses butter and onion?", "expected": ["r2"]},
-        {"query": "Tomato pasta—what do I add after draining?", "expected": ["r1"]},
-
-        # Similar protein cooking queries (force right dish)
-        {"query": "How do I know chicken is fully cooked? What temperature?", "expected": ["r3"]},
-        {"query": "Bake fish with lemon—what temperature and time?", "expected": ["r4"]},
-
-        # Short keyword-y queries
-        {"query": "soy sauce sesame oil stir fry", "expected": ["r5"]},
-        {"query": "kidney beans ground beef spices", "expected": ["r6"]},
-        {"query": "romaine croutons parmesan chicken", "expected": ["r7"]},
-
-        # Dessert ambiguity
-        {"query": "quick chocolate cake in a cup microwave time", "expected": ["r9"]},
-        {"query": "banana breakfast batter flip when bubbles", "expected": ["r10"]},
-
-        # Edge phrasing / incomplete
-        {"query": "overnight oats: how many hours?", "expected": ["r8"]},
-
-        # Noisy queries
-        {"query": "tomato pasta garlic time simmer", "expected": ["r1"]},
-        {"query": "tommato spageti garlic simer how long", "expected": ["r1"]},
-        {"query": "сколько минут тушить томаты для пасты?", "expected": ["r1"]},
-
-        {"query": "cream mushroom pasta how much cream", "expected": ["r2"]},
-        {"query": "cremy mushrom pasta cream ml?", "expected": ["r2"]},
-        {"query": "сколько сливок в пасте с грибами?", "expected": ["r2"]},
-
-        {"query": "mug cake microwave seconds", "expected": ["r9"]},
-        {"query": "choc mug cake microwvave 45 or 60 sec", "expected": ["r9"]},
-        {"query": "сколько секунд готовить кекс в кружке?", "expected": ["r9"]},
-        {"query": "Quick beef chili: after adding tomatoes and beans, exactly how many minutes should it simmer?", "expected": ["r6"]},
-        {"query": "Overnight oats: what is the minimum chill time in hours?", "expected": ["r8"]},
-
-    ]
-
-    QUERIES_PROJECT = [
-        # Planning Benchmark
-        {"query": "For a healthy family breakfast, how long should overnight oats chill?", "expected": ["r8"]},
-        {"query": "Low-sugar breakfast: what are the exact amounts for overnight oats?", "expected": ["r8"]},
-        {"query": "Breakfast for kids: how long do I cook banana pancakes on each side?", "expected": ["r10"]},
-        {"query": "What ingredients do I need for banana pancakes, with quantities?", "expected": ["r10"]},
-
-        {"query": "Chicken night (only once this week): what internal temperature should chicken thighs reach?", "expected": ["r3"]},
-        {"query": "Chicken thighs: how long do I sear skin-side down?", "expected": ["r3"]},
-
-        {"query": "Fish night (only once this week): what oven temperature do I bake salmon at?", "expected": ["r4"]},
-        {"query": "How many minutes do I bake salmon fillets in the oven?", "expected": ["r4"]},
-
-        {"query": "Meat-based dinner: what spices are in the quick beef chili?", "expected": ["r6"]},
-        {"query": "Quick beef chili: how long should it simmer after adding beans?", "expected": ["r6"]},
-
-        {"query": "Weeknight pasta: how long should I simmer tomatoes for simple tomato spaghetti?", "expected": ["r1"]},
-        {"query": "Creamy mushroom pasta: how many ml of cream does it use?", "expected": ["r2"]},
-        {"query": "Vegetable stir-fry: how long do I stir-fry the vegetables before adding soy sauce?", "expected": ["r5"]},
-
-        {"query": "Tomato garlic pasta: how many minutes do I simmer the tomatoes?", "expected": ["r1", "r12", "r35", "r36", "r37"]},
-        {"query": "Chocolate mug cake: should I microwave 45 seconds or 60 seconds?", "expected": ["r9", "r46", "r47", "r48"]},
-
-    ]
-
+    clients = EvalClients()
+    # "llm" keeps the original gpt-4o-mini JSON reranker; anything else runs locally.
+    ranker = clients if args.reranker == "llm" else make_reranker(args.reranker)
+    if args.dims or args.storage:
+        compare_storage(clients, QUERIES_RETRIEVAL + QUERIES_PROJECT, args.k, args.dims, args.rescore)
+        return
+    db = connect_db()
 
     results = []
-    for i in range(args.runs):
-        r = run_once(QUERIES_RETRIEVAL, k=args.k)
-        results.append(r)
-        print(f"\n=== RUN {i+1}/{args.runs} (K={args.k}) ===")
-        print(f"Baseline  Recall@{args.k}: {r['baseline_recall']:.3f}   MRR@{args.k}: {r['baseline_mrr']:.3f}")
-        print(f"Enhanced  Recall@{args.k}: {r['enhanced_recall']:.3f}   MRR@{args.k}: {r['enhanced_mrr']:.3f}")
+    try:
+        t0 = time.perf_counter()
+        dims = len(clients.embed(QUERIES_RETRIEVAL[0]["query"]))
+        base_col, chunk_col = prepare_collections(db, clients, reuse=args.reuse, quantizer=args.quantizer, dims=dims)
+        print(f"Ingestion: {time.perf_counter() - t0:.2f}s")
+        storage = (f"{args.quantizer}, {vector_bytes(args.quantizer, dims)} B/vector "
+                   f"vs {vector_bytes('none', dims)} B float32 ({dims}d)")
+        if args.calibrate:
+            calibrate(base_col, chunk_col, clients, args.min_recall)
+            return
+
+        for i in range(args.runs):
+            r = run_once(base_col, chunk_col, clients, ranker, QUERIES_RETRIEVAL, k=args.k, workers=args.workers)
+            results.append(r)
+            print(f"\n=== RUN {i+1}/{args.runs} (K={args.k}) ===")
+            print(f"Baseline  Recall@{args.k}: {r['baseline_recall']:.3f}   MRR@{args.k}: {r['baseline_mrr']:.3f}")
+            print(f"Enhanced  Recall@{args.k}: {r['enhanced_recall']:.3f}   MRR@{args.k}: {r['enhanced_mrr']:.3f}")
+            print(f"Vectors:  {storage}")
+            print(f"Wall time: {r['wall_s']:.2f}s   Throughput: {r['qps']:.1f} queries/s")
+    finally:
+        db.close()
 
     # Means across runs
     b_mrrs = [r["baseline_mrr"] for r in results]
@@ -435,8 +601,11 @@ def main():
     print("\n=== SUMMARY (MEANS OVER RUNS) ===")
     print(f"Baseline mean  Recall@{args.k}: {b_recall_mean:.3f}   MRR@{args.k}: {b_mrr_mean:.3f}")
     print(f"Enhanced mean  Recall@{args.k}: {e_recall_mean:.3f}   MRR@{args.k}: {e_mrr_mean:.3f}")
+    print(f"Vector storage: {storage}")
     print(f"MRR improvement:   {mrr_improvement*100:.1f}%")
     print(f"Recall improvement:{recall_improvement*100:.1f}%")
+    print(f"Mean wall time per run: {statistics.mean(r['wall_s'] for r in results):.2f}s   "
+          f"Mean throughput: {statistics.mean(r['qps'] for r in results):.1f} queries/s")
     print("ACCEPTANCE:", "✅ PASS (>=30% MRR improvement)" if pass_overall else "❌ NOT YET")
 
     # Markdown block for your report
@@ -448,7 +617,8 @@ def main():
 **Enhanced runs (MRR@{args.k}):** {", ".join(f"{x:.3f}" for x in e_mrrs)}
 
 **Baseline mean MRR@{args.k}:** {b_mrr_mean:.3f}  
-**Enhanced mean MRR@{args.k}:** {e_mrr_mean:.3f}
+**Enhanced mean MRR@{args.k}:** {e_mrr_mean:.3f}  
+**Vector storage:** {storage}
 
 **Improvement% (using means):** {mrr_improvement*100:.1f}%  
 **Threshold:** 30%
@@ -0,0 +1,123 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+
+@dataclass
+class _Entry:
+    answer: str
+    context: str
+    vector: np.ndarray
+    note_ids: Tuple[str, ...]
+    created: float
+
+class AnswerCache:
+    """
+    LRU/TTL cache in front of RagApp.answer.
+
+    - Exact hits match on the normalized question text (plus any scope such as k).
+    - Semantic hits need the same retrieved note_ids and a query embedding within
+      `similarity` cosine of a cached one, so the LLM would have seen the same context.
+
+    A question that misses both tiers is one miss; the caller reports it with `record_miss`.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600.0, similarity: float = 0.95) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(question: str, *scope) -> str:
+        text = re.sub(r"\s+", " ", question.strip().lower()).rstrip("?!. ")
+        return "|".join([*(repr(s) for s in scope), text])
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry.created > self.ttl_seconds
+
+    def get_exact(self, key: str) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, time.time()):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.answer, entry.context
+
+    def get_similar(self, vector: List[float], note_ids: Tuple[str, ...]) -> Optional[Tuple[str, str]]:
+        q = self._unit(vector)
+        now = time.time()
+        with self._lock:
+            best_key, best_sim = None, self.similarity
+            for key, entry in list(self._entries.items()):
+                if self._expired(entry, now):
+                    del self._entries[key]
+                    continue
+                if entry.note_ids != note_ids:
+                    continue
+                sim = float(entry.vector @ q)
+                if sim >= best_sim:
+                    best_key, best_sim = key, sim
+
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self.semantic_hits += 1
+            entry = self._entries[best_key]
+            return entry.answer, entry.context
+
+    def put(self, key: str, vector: List[float], note_ids: Tuple[str, ...], answer: str, context: str) -> None:
+        entry = _Entry(answer, context, self._unit(vector), tuple(note_ids), time.time())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate_notes(self, note_ids: Iterable[str]) -> None:
+        """Drop every answer that was grounded in any of the given recipes."""
+        changed = set(note_ids)
+        if not changed:
+            return
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if changed.intersection(e.note_ids)]:
+                del self._entries[key]
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
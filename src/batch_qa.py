@@ -0,0 +1,334 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Set, TypeVar, Union
+import openai
+from .config import Settings
+from .context_packer import PackedContext, count_tokens
+from .filters import parse_filters
+from .embeddings import make_embedding_client
+from .ingest import batched
+from .llm import OpenAIChatClient
+from .rag_app import RagApp
+from .tracing import Trace
+
+T = TypeVar("T")
+
+# Token reservations for a rag_answer call beyond the packed context and question:
+# the system prompt and framing, and room for the completion.
+PROMPT_OVERHEAD_TOKENS = 120
+COMPLETION_RESERVE_TOKENS = 400
+# Questions embedded per API call batch; answering starts after the first batch.
+EMBED_CHUNK = 512
+
+class _Bucket:
+    """`per_minute` units refilled continuously; starts full. 0 means unlimited."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def wait(self, amount: float, now: float) -> float:
+        """Seconds until `amount` fits (0 if it does now); a request above capacity waits for a full bucket."""
+        if self.capacity <= 0:
+            return 0.0
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        short = min(amount, self.capacity) - self.level
+        return short / self.rate if short > 0 else 0.0
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            self.level -= min(amount, self.capacity)
+
+class RateLimiter:
+    """
+    Token-bucket limiter for one API quota: requests and tokens per minute.
+
+    `acquire` blocks until both buckets have room. Token costs are estimates; `settle`
+    charges (or refunds) the difference once the real usage is known, and `pause` holds
+    every caller back after a 429 so the whole pool backs off together.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int) -> None:
+        self._lock = threading.Lock()
+        self._requests = _Bucket(requests_per_minute)
+        self._tokens = _Bucket(tokens_per_minute)
+        self._paused_until = 0.0
+        self.throttled = 0  # 429 responses seen
+
+    def acquire(self, tokens: int) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = max(
+                    self._paused_until - now,
+                    self._requests.wait(1, now),
+                    self._tokens.wait(tokens, now),
+                )
+                if delay <= 0:
+                    self._requests.take(1)
+                    self._tokens.take(tokens)
+                    return
+            time.sleep(delay)
+
+    def settle(self, estimated: int, actual: int) -> None:
+        with self._lock:
+            if self._tokens.capacity > 0:
+                self._tokens.level -= actual - estimated
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+def _retry_after(exc: openai.RateLimitError) -> Optional[float]:
+    try:
+        return float(exc.response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+def with_backoff(
+    call: Callable[[], T],
+    max_retries: int,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    on_retry: Optional[Callable[[float], None]] = None,
+) -> T:
+    """Run `call`, retrying 429s with jittered exponential backoff (or the server's Retry-After)."""
+    attempt = 0
+    while True:
+        try:
+            return call()
+        except openai.RateLimitError as exc:
+            if attempt >= max_retries:
+                raise
+            delay = _retry_after(exc) or min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            attempt += 1
+            if on_retry is not None:
+                on_retry(delay)
+            time.sleep(delay)
+
+class RateLimitedChat:
+    """
+    Wraps a chat client so rag_answer calls go through a RateLimiter and retry on 429.
+    Everything else (packer, answer_without_context, ...) is passed through unchanged.
+    """
+
+    def __init__(self, llm, limiter: RateLimiter, max_retries: int = 6) -> None:
+        self.llm = llm
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    def __getattr__(self, name: str):
+        return getattr(self.llm, name)
+
+    def rag_answer(
+        self, context: Union[str, PackedContext], question: str, trace: Optional[Trace] = None
+    ) -> str:
+        packed = self.llm.packer.pack_text(context)
+        question_tokens = count_tokens(question, getattr(self.llm, "model", ""))
+        estimate = packed.tokens + question_tokens + PROMPT_OVERHEAD_TOKENS + COMPLETION_RESERVE_TOKENS
+
+        def call() -> str:
+            self.limiter.acquire(estimate)
+            return self.llm.rag_answer(packed, question, trace=trace)
+
+        answer = with_backoff(call, self.max_retries, on_retry=self.limiter.pause)
+        if trace is not None and "prompt_tokens" in trace.attrs:
+            self.limiter.settle(estimate, trace.attrs["prompt_tokens"] + trace.attrs["completion_tokens"])
+        return answer
+
+@dataclass
+class BatchStats:
+    answered: int = 0
+    failed: int = 0
+    skipped: int = 0  # already in the output file (--resume)
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+def read_questions(path: str) -> Iterator[dict]:
+    """
+    One JSON object per line: {"question": ..., "id"?: ..., "k"?: 3, "filters"?: ["meal_type=dinner"]}.
+    A missing id defaults to the line number.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if not row.get("question"):
+                raise ValueError(f"{path}:{n}: missing 'question'")
+            row.setdefault("id", n)
+            yield row
+
+def _done_ids(path: Path) -> Set[str]:
+    """Ids answered without error by an earlier run over the same output file."""
+    if not path.exists():
+        return set()
+    done = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by an interrupted run
+            if "error" not in row:
+                done.add(str(row["id"]))
+    return done
+
+class BatchRunner:
+    """
+    Answers a stream of questions with a bounded worker pool.
+
+    Questions are embedded in bulk (EMBED_CHUNK at a time), then each worker runs
+    retrieval and one chat completion through the app's (rate-limited) LLM. Results
+    are written to `out` as soon as they complete, so output order follows completion.
+    """
+
+    def __init__(
+        self,
+        app: RagApp,
+        concurrency: int = 8,
+        max_retries: int = 6,
+        k: int = 3,
+        limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        self.app = app
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.k = k
+        # Embedding 429s pause the shared limiter too, so the whole pool backs off.
+        self.limiter = limiter
+
+    def _answer_one(self, row: dict, qvec: List[float]) -> dict:
+        trace = Trace(row["question"])
+        out = {"id": row["id"], "question": row["question"]}
+        try:
+            filters = parse_filters(row.get("filters", []))
+            answer, _ = self.app.answer(row["question"], k=row.get("k", self.k), filters=filters, trace=trace, qvec=qvec)
+            out["answer"] = answer
+            out["note_ids"] = trace.attrs.get("note_ids", [])
+        except Exception as exc:  # one bad question must not sink the batch
+            out["error"] = f"{type(exc).__name__}: {exc}"
+        for key in ("cache", "gated", "prompt_tokens", "completion_tokens"):
+            if key in trace.attrs:
+                out[key] = trace.attrs[key]
+        out["latency_s"] = round(time.perf_counter() - trace.started, 3)
+        return out
+
+    def run(self, rows: Iterable[dict], out, skip: Set[str] = frozenset(), progress=None) -> BatchStats:
+        stats = BatchStats()
+        lock = threading.Lock()
+        # Bounded backlog so later chunks embed while earlier questions are answered.
+        backlog = threading.BoundedSemaphore(self.concurrency * 4)
+        failures: List[BaseException] = []
+
+        def write(fut: Future) -> None:
+            # Runs on the worker that finished, so each result goes out as soon as it is ready.
+            try:
+                row = fut.result()
+                with lock:
+                    out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    out.flush()
+                    if "error" in row:
+                        stats.failed += 1
+                    else:
+                        stats.answered += 1
+                    if progress is not None:
+                        progress(stats)
+            except BaseException as exc:  # surfaced by run(); the executor would only log it
+                failures.append(exc)
+            finally:
+                backlog.release()
+
+        def todo() -> Iterator[dict]:
+            for row in rows:
+                if str(row["id"]) in skip:
+                    stats.skipped += 1
+                    continue
+                yield row
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch-qa") as pool:
+            for chunk in batched(todo(), EMBED_CHUNK):
+                questions = [row["question"] for row in chunk]
+                qvecs = with_backoff(
+                    lambda: self.app.embedder.embed_texts(questions),
+                    self.max_retries,
+                    on_retry=self.limiter.pause if self.limiter else None,
+                )
+                for row, qvec in zip(chunk, qvecs):
+                    backlog.acquire()
+                    if failures:
+                        break
+                    pool.submit(self._answer_one, row, qvec).add_done_callback(write)
+                if failures:
+                    break
+        if failures:
+            raise failures[0]
+        return stats
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions with the RAG pipeline")
+    parser.add_argument("questions", help="input .jsonl, one {\"question\": ...} per line")
+    parser.add_argument("-o", "--out", required=True, help="output .jsonl (one answer per line, in completion order)")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, help="questions in flight (default: BATCH_CONCURRENCY)")
+    parser.add_argument("--resume", action="store_true", help="append to --out and skip ids already answered")
+    args = parser.parse_args()
+
+    settings = Settings()
+    limiter = RateLimiter(settings.chat_requests_per_minute, settings.chat_tokens_per_minute)
+    # SDK retries off: every 429, chat or embedding, must reach the limiter so the whole pool pauses.
+    llm = OpenAIChatClient(
+        settings.chat_model, max_context_tokens=settings.max_context_tokens, max_retries=0, settings=settings
+    )
+    app = RagApp(
+        settings,
+        embedder=make_embedding_client(settings, max_retries=0),
+        llm=RateLimitedChat(llm, limiter, max_retries=settings.rate_limit_max_retries),
+    )
+    runner = BatchRunner(
+        app,
+        concurrency=args.concurrency or settings.batch_concurrency,
+        max_retries=settings.rate_limit_max_retries,
+        k=args.k,
+        limiter=limiter,
+    )
+
+    out_path = Path(args.out)
+    skip = _done_ids(out_path) if args.resume else set()
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    last = time.perf_counter()
+
+    def progress(stats: BatchStats) -> None:
+        nonlocal last
+        if time.perf_counter() - last >= 2.0:
+            last = time.perf_counter()
+            done = stats.answered + stats.failed
+            print(f"Answered {done} questions ({done / stats.elapsed:.1f}/s, {limiter.throttled} throttled)",
+                  file=sys.stderr, flush=True)
+
+    try:
+        with open(out_path, "a" if args.resume else "w", encoding="utf-8") as out:
+            stats = runner.run(read_questions(args.questions), out, skip=skip, progress=progress)
+    finally:
+        app.close()
+    done = stats.answered + stats.failed
+    resumed = f", {stats.skipped} already answered" if stats.skipped else ""
+    print(f"✅ {stats.answered} answered, {stats.failed} failed in {stats.elapsed:.1f}s "
+          f"({done / stats.elapsed:.1f}/s, {limiter.throttled} rate-limit retries{resumed})")
+
+if __name__ == "__main__":
+    main()
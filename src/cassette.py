@@ -0,0 +1,130 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import zlib
+from functools import partial
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Iterator, Optional
+from openai import OpenAI
+from openai.types import CreateEmbeddingResponse
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from .config import Settings
+
+MODES = {"off", "record", "replay", "auto"}
+
+class CassetteMiss(KeyError):
+    """Replay mode was asked for a request that was never recorded."""
+
+class CassetteStore:
+    """Recorded OpenAI responses in SQLite (zlib-compressed JSON), keyed by kind, model and payload."""
+
+    def __init__(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cassette (key TEXT PRIMARY KEY, body BLOB NOT NULL)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(kind: str, payload: dict) -> str:
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        return f"{kind}:{payload.get('model', '')}:{digest}"
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM cassette WHERE key = ?", (key,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def put(self, key: str, value: Any) -> None:
+        body = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO cassette (key, body) VALUES (?, ?)", (key, body))
+            self._conn.commit()
+
+class CassetteOpenAI:
+    """
+    Stand-in for the OpenAI client covering embeddings.create and chat.completions.create
+    (including stream=True).
+    - record: always call the API and store the response
+    - replay: serve only from the store; never touches the network or needs an API key
+    - auto:   replay when recorded, otherwise record
+    """
+
+    def __init__(self, store: CassetteStore, mode: str, factory: Callable[[], Any] = OpenAI) -> None:
+        if mode not in MODES - {"off"}:
+            raise ValueError(f"Unknown cassette mode: {mode!r}")
+        self.store = store
+        self.mode = mode
+        self._factory = factory
+        self._real = None
+        self._real_lock = threading.Lock()
+        self.embeddings = SimpleNamespace(create=self._create_embedding)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat))
+
+    @property
+    def real(self):
+        with self._real_lock:
+            if self._real is None:
+                self._real = self._factory()
+            return self._real
+
+    def _lookup(self, key: str) -> Optional[Any]:
+        if self.mode == "record":
+            return None
+        recorded = self.store.get(key)
+        if recorded is None and self.mode == "replay":
+            raise CassetteMiss(f"No recorded response for {key}")
+        return recorded
+
+    def _create_embedding(self, **kwargs) -> CreateEmbeddingResponse:
+        key = CassetteStore.key("embeddings", kwargs)
+        recorded = self._lookup(key)
+        if recorded is None:
+            resp = self.real.embeddings.create(**kwargs)
+            self.store.put(key, resp.model_dump(mode="json"))
+            return resp
+        return CreateEmbeddingResponse.model_validate(recorded)
+
+    def _create_chat(self, **kwargs):
+        key = CassetteStore.key("chat", kwargs)
+        recorded = self._lookup(key)
+        if kwargs.get("stream"):
+            if recorded is None:
+                return self._record_stream(key, self.real.chat.completions.create(**kwargs))
+            return (ChatCompletionChunk.model_validate(c) for c in recorded)
+
+        if recorded is None:
+            resp = self.real.chat.completions.create(**kwargs)
+            self.store.put(key, resp.model_dump(mode="json"))
+            return resp
+        return ChatCompletion.model_validate(recorded)
+
+    def _record_stream(self, key: str, stream) -> Iterator[ChatCompletionChunk]:
+        # Pass chunks through as they arrive; store the stream once it completes.
+        chunks = []
+        for chunk in stream:
+            chunks.append(chunk.model_dump(mode="json"))
+            yield chunk
+        self.store.put(key, chunks)
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+def openai_client(settings: Optional[Settings] = None, max_retries: Optional[int] = None):
+    """
+    OpenAI client, or its record/replay stand-in when OPENAI_CASSETTE_MODE is set.
+    `max_retries` overrides the SDK's own retries (None keeps its default).
+    """
+    settings = settings or Settings()
+    factory = OpenAI if max_retries is None else partial(OpenAI, max_retries=max_retries)
+    if settings.openai_cassette_mode == "off":
+        return factory()
+    with _STORES_LOCK:
+        store = _STORES.get(settings.openai_cassette_path)
+        if store is None:
+            store = _STORES[settings.openai_cassette_path] = CassetteStore(settings.openai_cassette_path)
+    return CassetteOpenAI(store, settings.openai_cassette_mode, factory)
@@ -0,0 +1,53 @@
+from typing import Dict, List, Tuple
+from .models import HitMetadata, SearchHit, SearchResults
+
+SECTION_ORDER = ("ingredients", "instructions")
+
+def chunk_recipe(content: str) -> List[Tuple[str, str]]:
+    """Split recipe content into (section, text) pairs: ingredients and instructions."""
+    parts = content.split("Instructions:\n", 1)
+    if len(parts) == 2:
+        before, after = parts
+        ingredients = before.strip()
+        instructions = ("Instructions:\n" + after.strip()).strip()
+    else:
+        ingredients = content
+        instructions = content
+
+    if "Ingredients:\n" in ingredients:
+        ingredients = "Ingredients:\n" + ingredients.split("Ingredients:\n", 1)[1].strip()
+
+    return [
+        ("ingredients", ingredients),
+        ("instructions", instructions),
+    ]
+
+def section_text(title: str, section: str, text: str) -> str:
+    """Text that gets embedded for one section chunk."""
+    return f"{title}\nsection:{section}\n{text}"
+
+def aggregate_sections(results, top_recipes: int) -> SearchResults:
+    """
+    Collapse section hits into one hit per recipe, in order of each recipe's best chunk.
+    Only the matched sections end up in `content`; the distance is the recipe's best one.
+    """
+    merged: Dict[str, SearchHit] = {}
+    parts: Dict[str, Dict[str, str]] = {}
+    for obj in results.objects:
+        p = obj.properties
+        note_id = p["note_id"]
+        if note_id not in merged:
+            if len(merged) == top_recipes:
+                continue
+            props = {key: val for key, val in p.items() if key not in {"section", "content"}}
+            merged[note_id] = SearchHit(properties=props, metadata=HitMetadata(distance=obj.metadata.distance))
+            parts[note_id] = {}
+        # Recipes without an Instructions header yield identical sections; keep one.
+        if p["content"] not in parts[note_id].values():
+            parts[note_id][p.get("section") or "full"] = p["content"]
+
+    for note_id, hit in merged.items():
+        sections = sorted(parts[note_id], key=lambda s: SECTION_ORDER.index(s) if s in SECTION_ORDER else len(SECTION_ORDER))
+        hit.properties["sections"] = sections
+        hit.properties["content"] = "\n\n".join(parts[note_id][s] for s in sections)
+    return SearchResults(objects=list(merged.values()))
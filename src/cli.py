@@ -1,12 +1,63 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from .config import Settings
+from .filters import parse_filters
+from .planner import Planner
 from .rag_app import RagApp
+from .tracing import Trace
+
+RAG_HEADER = "--- RAG ANSWER ---"
+BASELINE_HEADER = "--- NO-RAG ANSWER (BASELINE LLM) ---"
+
+def _answer_blocking(app: RagApp, pool: ThreadPoolExecutor, q: str, filters, trace: Trace) -> None:
+    rag = pool.submit(lambda: app.answer(q, k=3, filters=filters, trace=trace)[0])
+    baseline = pool.submit(app.llm.answer_without_context, q)
+    headers = {rag: RAG_HEADER, baseline: BASELINE_HEADER}
+
+    # Print whichever finishes first.
+    for fut in as_completed(headers):
+        print(f"\n{headers[fut]}")
+        print(fut.result())
+
+def _answer_streaming(app: RagApp, pool: ThreadPoolExecutor, q: str, filters, trace: Trace) -> None:
+    baseline = pool.submit(app.llm.answer_without_context, q)
+
+    print(f"\n{RAG_HEADER}")
+    stream, _ = app.answer_stream(q, k=3, filters=filters, trace=trace)
+    for token in stream:
+        print(token, end="", flush=True)
+    print()
+    if stream.ttft is not None:
+        print(f"(time to first token: {stream.ttft:.2f}s, total: {stream.total_time:.2f}s)")
+
+    print(f"\n{BASELINE_HEADER}")
+    print(baseline.result())
+
+def _print_percentiles(app: RagApp) -> None:
+    print("\n--- LATENCY (ms) ---")
+    for name, stats in app.metrics.percentiles().items():
+        p50, p95, p99 = (stats[q] * 1000 for q in ("p50", "p95", "p99"))
+        print(f"{name:>8}: p50 {p50:.1f}  p95 {p95:.1f}  p99 {p99:.1f}  (n={stats['count']})")
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="RAG Recipe Assistant")
+    parser.add_argument("--no-stream", action="store_true", help="print answers only once complete")
+    parser.add_argument(
+        "--filter", action="append", default=[], metavar="FIELD=VALUE",
+        help="restrict retrieval by metadata, e.g. meal_type=breakfast or protein_source!=chicken",
+    )
+    parser.add_argument("--profile", action="store_true", help="print per-stage timings for every answer")
+    args = parser.parse_args()
+    filters = parse_filters(args.filter)
+
     settings = Settings()
     app = RagApp(settings)
+    # The baseline answer doesn't depend on retrieval, so it runs alongside the RAG chain.
+    pool = ThreadPoolExecutor(max_workers=2)
+    answer = _answer_blocking if args.no_stream else _answer_streaming
 
     print("\n✅ OpenAI RAG Recipe Assistant ready.")
-    print("Ask any cooking question, or type 'exit'.\n")
+    print("Ask any cooking question, type 'plan' for a weekly meal plan, or 'exit'.\n")
 
     try:
         while True:
@@ -15,16 +66,24 @@ def main() -> None:
                 continue
             if q.lower() in {"exit", "quit"}:
                 break
+            if q.lower() == "plan":
+                planner = Planner(app.recipes, llm=app.llm, ingredients=app.ingredients.ingredients)
+                print(f"\n--- WEEKLY PLAN ---\n{planner.describe(planner.create_weekly_plan())}\n")
+                continue
 
-            answer, _ = app.answer(q, k=3)
-
-            print("\n--- RAG ANSWER ---")
-            print(answer)
-            print("\n--- NO-RAG ANSWER (BASELINE LLM) ---")
-            print(app.llm.answer_without_context(q))
+            trace = Trace(q)
+            answer(app, pool, q, filters, trace)
+            if args.profile:
+                print(f"\n--- PROFILE ---\n{trace.summary()}")
+            print()
     finally:
-        app.db.close()
-        print("🔒 Closed Weaviate client.")
+        pool.shutdown(wait=False, cancel_futures=True)
+        if args.profile and app.metrics.percentiles():
+            _print_percentiles(app)
+        if settings.trace_prometheus_path:
+            app.metrics.write_prometheus(settings.trace_prometheus_path)
+        app.close()
+        print("🔒 Closed vector store.")
 
 if __name__ == "__main__":
     main()
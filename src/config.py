@@ -11,9 +11,95 @@ class Settings:
     weaviate_grpc_port: int = int(os.getenv("WEAVIATE_GRPC_PORT", "50051"))
 
     collection_name: str = os.getenv("WEAVIATE_COLLECTION", "RecipeNote")
+    chunk_collection_name: str = os.getenv("WEAVIATE_CHUNK_COLLECTION", "RecipeSection")
+
+    # "recipe": one vector per recipe. "chunked": one vector per ingredients/instructions
+    # section, aggregated back to recipes at query time.
+    index_mode: str = os.getenv("INDEX_MODE", "recipe")
+    # Section hits fetched per requested recipe in chunked mode.
+    chunk_fanout: int = int(os.getenv("CHUNK_FANOUT", "4"))
+
+    # "vector" or "hybrid" (BM25 + vector, fused with reciprocal-rank fusion).
+    retrieval_mode: str = os.getenv("RETRIEVAL_MODE", "vector")
+    # Character n-gram size added to the lexical index for misspellings; 0 disables.
+    lexical_ngram: int = int(os.getenv("LEXICAL_NGRAM", "3"))
+
+    # Second-stage reranker: "none", "bm25", "cross-encoder" or "cross-encoder:<model>".
+    reranker: str = os.getenv("RERANKER", "none")
+    # Candidates fetched per final result when a reranker is configured.
+    rerank_fanout: int = int(os.getenv("RERANK_FANOUT", "4"))
+
+    # "weaviate" or "local" (in-process NumPy index persisted under local_index_dir).
+    vector_backend: str = os.getenv("VECTOR_BACKEND", "weaviate")
+    local_index_dir: str = os.getenv("LOCAL_INDEX_DIR", ".index")
+    # Two-stage search: index only the first N embedding dimensions and re-score
+    # matryoshka_rescore x k candidates with full vectors kept under local_index_dir. 0 disables.
+    matryoshka_dims: int = int(os.getenv("MATRYOSHKA_DIMS", "0"))
+    matryoshka_rescore: int = int(os.getenv("MATRYOSHKA_RESCORE", "4"))
+    # Compressed vector storage: "none", "float16" / "int8" (local backend) or "pq" / "bq" / "sq"
+    # (Weaviate, applied when the collection is created). QUANTIZATION_RESCORE > 0 makes a quantized
+    # local index re-score that many x k candidates against a second, float32 copy of the vectors:
+    # better recall, but int8 + rescore then stores 1.25x what plain float32 does. Off by default.
+    vector_quantization: str = os.getenv("VECTOR_QUANTIZATION", "none")
+    quantization_rescore: int = int(os.getenv("QUANTIZATION_RESCORE", "0"))
 
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    # Shortened embeddings from the API (text-embedding-3 only); 0 keeps the model's full size.
+    embedding_dimensions: int = int(os.getenv("EMBEDDING_DIMENSIONS", "0"))
+    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+    embedding_batch_tokens: int = int(os.getenv("EMBEDDING_BATCH_TOKENS", "200000"))
+    embedding_concurrency: int = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+    # Local ("local:<model>") embedding options: texts per forward pass (kept small, unlike the
+    # API's per-request limit above), CPU threads (0 = torch default) and int8 quantization.
+    embedding_local_batch_size: int = int(os.getenv("EMBEDDING_LOCAL_BATCH_SIZE", "32"))
+    embedding_threads: int = int(os.getenv("EMBEDDING_THREADS", "0"))
+    embedding_quantize: bool = os.getenv("EMBEDDING_QUANTIZE", "false").lower() in {"1", "true", "yes"}
     chat_model: str = os.getenv("CHAT_MODEL", "gpt-4o-mini")
 
-    max_context_chars: int = int(os.getenv("MAX_CONTEXT_CHARS", "8000"))
+    # Record/replay of OpenAI calls: "off", "record", "replay" or "auto".
+    openai_cassette_mode: str = os.getenv("OPENAI_CASSETTE_MODE", "off")
+    openai_cassette_path: str = os.getenv("OPENAI_CASSETTE_PATH", ".cache/openai_cassette.sqlite")
+
+    # Token budget for retrieved context; 0 uses the chat model's default.
+    max_context_tokens: int = int(os.getenv("MAX_CONTEXT_TOKENS", "0"))
     recipes_path: str = os.getenv("RECIPES_PATH", "recipes.json")
+    # Parsed ingredient records, kept next to the index; empty keeps them in memory only.
+    ingredients_path: str = os.getenv("INGREDIENTS_PATH", ".index/ingredients.json")
+
+    # "sync": keep the collection and only re-embed added/changed recipes.
+    # "rebuild": drop and re-ingest everything on startup.
+    ingest_mode: str = os.getenv("INGEST_MODE", "sync")
+    # Streaming ingestion: recipes per pipeline batch, parallel embedding batches, and how many
+    # batches may wait between stages. An interrupted run resumes from the checkpoint ("" disables).
+    ingest_batch_size: int = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+    ingest_embed_workers: int = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+    ingest_queue_depth: int = int(os.getenv("INGEST_QUEUE_DEPTH", "4"))
+    ingest_checkpoint_path: str = os.getenv("INGEST_CHECKPOINT_PATH", ".cache/ingest_checkpoint.json")
+    ingest_checkpoint_every: int = int(os.getenv("INGEST_CHECKPOINT_EVERY", "8"))
+    # Weaviate client-side batching for inserts.
+    weaviate_batch_size: int = int(os.getenv("WEAVIATE_BATCH_SIZE", "200"))
+    weaviate_concurrent_requests: int = int(os.getenv("WEAVIATE_CONCURRENT_REQUESTS", "2"))
+
+    # Empty path disables the on-disk embedding cache.
+    embedding_cache_path: str = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite")
+    embedding_cache_max_mb: int = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+
+    # Answer cache in front of RagApp.answer; size 0 disables it.
+    answer_cache_size: int = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+    answer_cache_ttl_s: float = float(os.getenv("ANSWER_CACHE_TTL_S", "3600"))
+    answer_cache_similarity: float = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+    # Refuse without calling the LLM when the best vector hit is farther than this cosine
+    # distance; 0 disables. Calibrate per embedding model/index mode: evaluate_rag.py --calibrate
+    relevance_max_distance: float = float(os.getenv("RELEVANCE_MAX_DISTANCE", "0"))
+
+    # Optional trace outputs: one JSON line per answer, and a Prometheus text dump on exit.
+    trace_jsonl_path: str = os.getenv("TRACE_JSONL_PATH", "")
+    trace_prometheus_path: str = os.getenv("TRACE_PROMETHEUS_PATH", "")
+
+    # Batch QA (python -m src.batch_qa): questions answered concurrently, and the chat quota
+    # to stay under (0 = unlimited). 429 responses are retried with exponential backoff.
+    batch_concurrency: int = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    chat_requests_per_minute: int = int(os.getenv("CHAT_REQUESTS_PER_MINUTE", "500"))
+    chat_tokens_per_minute: int = int(os.getenv("CHAT_TOKENS_PER_MINUTE", "200000"))
+    rate_limit_max_retries: int = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "6"))
@@ -0,0 +1,102 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Sequence, Tuple, Union
+from .embeddings import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to the ~4 chars/token estimate
+    tiktoken = None
+
+SECTION_SEPARATOR = "\n\n---\n\n"
+
+# Token budget for the CONTEXT block per chat model (~8000 characters of recipe text).
+MODEL_CONTEXT_BUDGETS = {
+    "gpt-4o-mini": 2000,
+    "gpt-4o": 2000,
+    "gpt-4.1-mini": 2000,
+    "gpt-4.1-nano": 1500,
+}
+DEFAULT_CONTEXT_BUDGET = 2000
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """The model's tiktoken encoding, or None to fall back to the estimate."""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:  # the BPE file is downloaded on first use, which fails offline
+        return None
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text))
+
+@dataclass(frozen=True)
+class PackedContext:
+    text: str
+    tokens: int
+    sections: int
+    dropped: int
+
+@dataclass
+class ContextPacker:
+    """
+    Packs whole context sections, in relevance order, into a token budget.
+    Repeated sections (same text modulo whitespace/case) are included once; a section
+    that doesn't fit is skipped rather than cut, so ingredient lines are never split. Only
+    a top section larger than the whole budget is cut, at a line boundary, so the context
+    is not left empty.
+    """
+    model: str
+    budget: int = 0
+
+    def __post_init__(self) -> None:
+        if self.budget <= 0:
+            self.budget = MODEL_CONTEXT_BUDGETS.get(self.model, DEFAULT_CONTEXT_BUDGET)
+
+    def pack(self, sections: Sequence[str]) -> PackedContext:
+        sep_tokens = count_tokens(SECTION_SEPARATOR, self.model)
+        seen = set()
+        chosen = []
+        used = dropped = 0
+        for section in sections:
+            norm = " ".join(section.split()).lower()
+            if not norm or norm in seen:
+                continue
+            seen.add(norm)
+
+            cost = count_tokens(section, self.model) + (sep_tokens if chosen else 0)
+            if used + cost > self.budget and not chosen:
+                section, cost = self._fit_lines(section)
+            if not section or used + cost > self.budget:
+                dropped += 1
+                continue
+            chosen.append(section)
+            used += cost
+        return PackedContext(SECTION_SEPARATOR.join(chosen), used, len(chosen), dropped)
+
+    def _fit_lines(self, section: str) -> Tuple[str, int]:
+        """The longest run of leading whole lines of `section` within the budget, and its tokens."""
+        lines = section.splitlines()
+        lo, hi = 0, len(lines)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if count_tokens("\n".join(lines[:mid]), self.model) <= self.budget:
+                lo = mid
+            else:
+                hi = mid - 1
+        text = "\n".join(lines[:lo])
+        return text, count_tokens(text, self.model)
+
+    def pack_text(self, context: Union[str, PackedContext]) -> PackedContext:
+        """Accept an already packed context as-is, or split a raw string on the separator."""
+        if isinstance(context, PackedContext):
+            return context
+        return self.pack(context.split(SECTION_SEPARATOR))
@@ -1,17 +1,140 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List
-from openai import OpenAI
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from .cassette import openai_client
+from .config import Settings
+from .embedding_cache import CachedEmbeddingClient, EmbeddingCache
+
+# EMBEDDING_MODEL values with this prefix run a sentence-transformers model locally on CPU,
+# e.g. "local:sentence-transformers/all-MiniLM-L6-v2".
+LOCAL_PREFIX = "local:"
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; good enough for request sizing.
+    return len(text) // 4 + 1
 
 @dataclass
 class OpenAIEmbeddingClient:
     model: str
+    max_batch_items: int = 256
+    max_batch_tokens: int = 200_000
+    max_concurrency: int = 4
+    # Shortened output for text-embedding-3 models; None returns the model's full size.
+    dimensions: Optional[int] = None
+    settings: Optional[Settings] = None  # cassette mode/path; None reads the environment
+    max_retries: Optional[int] = None  # None = SDK default
 
     def __post_init__(self) -> None:
-        self.client = OpenAI()
+        self.client = openai_client(self.settings, max_retries=self.max_retries)
+
+    def _batches(self, texts: List[str]) -> Iterator[Tuple[int, int]]:
+        """Yield contiguous [start, end) slices that respect the item and token limits."""
+        start, tokens = 0, 0
+        for i, text in enumerate(texts):
+            t = estimate_tokens(text)
+            if i > start and (i - start >= self.max_batch_items or tokens + t > self.max_batch_tokens):
+                yield start, i
+                start, tokens = i, 0
+            tokens += t
+        yield start, len(texts)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        extra = {"dimensions": self.dimensions} if self.dimensions else {}
+        resp = self.client.embeddings.create(model=self.model, input=texts, **extra)
+        return [item.embedding for item in sorted(resp.data, key=lambda d: d.index)]
 
     def embed_texts(self, texts: List[str]) -> List[List[float]]:
-        resp = self.client.embeddings.create(model=self.model, input=texts)
-        return [item.embedding for item in resp.data]
+        if not texts:
+            return []
+        slices = list(self._batches(texts))
+        if len(slices) == 1:
+            return self._embed_batch(texts)
+
+        # pool.map yields in submission order, so results line up with texts.
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(slices))) as pool:
+            parts = pool.map(self._embed_batch, [texts[s:e] for s, e in slices])
+            return [vec for part in parts for vec in part]
 
     def embed_query(self, text: str) -> List[float]:
         return self.embed_texts([text])[0]
+
+# Loaded sentence-transformers models, shared by every client in the process.
+_LOCAL_MODELS: Dict[Tuple[str, bool], Any] = {}
+_LOCAL_MODELS_LOCK = threading.Lock()
+
+def _load_local_model(name: str, quantize: bool):
+    with _LOCAL_MODELS_LOCK:
+        key = (name, quantize)
+        if key not in _LOCAL_MODELS:
+            import torch
+            from sentence_transformers import SentenceTransformer
+
+            model = SentenceTransformer(name, device="cpu")
+            if quantize:
+                # Dynamic int8 quantization of the Linear layers: smaller and faster on CPU.
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            model.eval()
+            _LOCAL_MODELS[key] = model
+        return _LOCAL_MODELS[key]
+
+@dataclass
+class SentenceTransformerEmbeddingClient:
+    model: str
+    batch_size: int = 32
+    num_threads: int = 0  # 0 = leave torch's default
+    quantize: bool = False
+
+    def __post_init__(self) -> None:
+        if self.num_threads > 0:
+            import torch
+            torch.set_num_threads(self.num_threads)
+        self._model = _load_local_model(self.model, self.quantize)
+
+    @property
+    def cache_model(self) -> str:
+        # Quantized weights give slightly different vectors; keep them apart in the cache.
+        return f"{LOCAL_PREFIX}{self.model}" + ("+int8" if self.quantize else "")
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        vecs = self._model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return vecs.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_texts([text])[0]
+
+def make_embedding_client(settings: Settings, max_retries: Optional[int] = None):
+    """
+    Embedding client selected by Settings.embedding_model, behind the disk cache if enabled.
+    `max_retries` overrides the OpenAI SDK's own retries (None keeps its default).
+    """
+    if settings.embedding_model.startswith(LOCAL_PREFIX):
+        client = SentenceTransformerEmbeddingClient(
+            settings.embedding_model[len(LOCAL_PREFIX):],
+            batch_size=settings.embedding_local_batch_size,
+            num_threads=settings.embedding_threads,
+            quantize=settings.embedding_quantize,
+        )
+    else:
+        client = OpenAIEmbeddingClient(
+            settings.embedding_model,
+            max_batch_items=settings.embedding_batch_size,
+            max_batch_tokens=settings.embedding_batch_tokens,
+            max_concurrency=settings.embedding_concurrency,
+            dimensions=settings.embedding_dimensions or None,
+            settings=settings,
+            max_retries=max_retries,
+        )
+
+    if settings.embedding_cache_path:
+        cache = EmbeddingCache(settings.embedding_cache_path, settings.embedding_cache_max_mb * 1024 * 1024)
+        return CachedEmbeddingClient(client, cache)
+    return client
@@ -0,0 +1,61 @@
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence
+
+# Metadata fields that can be filtered on, and whether they hold a list of values.
+FILTERABLE_FIELDS = {"meal_type": True, "tags": True, "protein_source": False}
+
+@dataclass(frozen=True)
+class MetadataFilter:
+    """
+    field == value, or field != value when negate is set.
+    For list fields (meal_type, tags) "==" means "contains" and "!=" means "does not contain".
+    """
+    field: str
+    value: str
+    negate: bool = False
+
+    def __post_init__(self) -> None:
+        if self.field not in FILTERABLE_FIELDS:
+            raise ValueError(f"Cannot filter on {self.field!r}; expected one of {sorted(FILTERABLE_FIELDS)}")
+
+    @property
+    def is_list(self) -> bool:
+        return FILTERABLE_FIELDS[self.field]
+
+    @classmethod
+    def parse(cls, expr: str) -> "MetadataFilter":
+        """Parse 'meal_type=breakfast' or 'protein_source!=chicken'."""
+        if "!=" in expr:
+            field, value = expr.split("!=", 1)
+            return cls(field.strip(), value.strip(), negate=True)
+        if "=" in expr:
+            field, value = expr.split("=", 1)
+            return cls(field.strip(), value.strip())
+        raise ValueError(f"Filter must look like field=value or field!=value, got {expr!r}")
+
+def parse_filters(exprs: Iterable[str]) -> List[MetadataFilter]:
+    return [MetadataFilter.parse(e) for e in exprs]
+
+def matches(props: dict, filters: Optional[Sequence[MetadataFilter]]) -> bool:
+    """Evaluate filters against a stored object's properties (for in-process indexes)."""
+    for f in filters or ():
+        value = props.get(f.field)
+        hit = f.value in (value or ()) if f.is_list else value == f.value
+        if hit == f.negate:
+            return False
+    return True
+
+def to_weaviate(filters: Optional[Sequence[MetadataFilter]]):
+    """Translate filters into a single Weaviate where-clause (or None)."""
+    if not filters:
+        return None
+    from weaviate.classes.query import Filter
+
+    clauses = []
+    for f in filters:
+        prop = Filter.by_property(f.field)
+        if f.is_list:
+            clauses.append(prop.contains_none([f.value]) if f.negate else prop.contains_any([f.value]))
+        else:
+            clauses.append(prop.not_equal(f.value) if f.negate else prop.equal(f.value))
+    return clauses[0] if len(clauses) == 1 else Filter.all_of(clauses)
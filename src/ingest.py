@@ -0,0 +1,302 @@
+import argparse
+import hashlib
+import json
+import queue
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+from .chunking import chunk_recipe, section_text
+from .config import Settings
+from .embeddings import make_embedding_client
+from .models import Recipe
+from .recipes_loader import iter_recipes, recipe_hash
+from .vector_store import open_vector_db
+
+T = TypeVar("T")
+
+# Bump when recipe_documents changes the text that gets embedded, so synced indexes re-embed.
+DOCUMENT_FORMAT = 1
+
+def index_scope(embedder, index_mode: str) -> str:
+    """What besides the recipe decides its vectors: embedding model and size, index mode, text format."""
+    model = getattr(embedder, "cache_model", embedder.model)
+    dims = getattr(embedder, "dimensions", None) or ""
+    return f"{model}:{dims}|{index_mode}|v{DOCUMENT_FORMAT}"
+
+def content_hash(recipe: Recipe, scope: str) -> str:
+    """Stored per object and compared on sync; changes with the recipe or with the index scope."""
+    return hashlib.sha256(f"{scope}\n{recipe_hash(recipe)}".encode("utf-8")).hexdigest()
+
+def recipe_documents(recipes: Iterable[Recipe], index_mode: str, scope: str = "") -> Tuple[List[str], List[dict]]:
+    """Texts to embed and the matching objects to store, per the index mode."""
+    texts: List[str] = []
+    notes: List[dict] = []
+    for r in recipes:
+        base = {
+            "note_id": r.id,
+            "title": r.title,
+            "content_hash": content_hash(r, scope),
+            "tags": list(r.tags),
+            "protein_source": r.protein_source,
+            "meal_type": list(r.meal_type),
+        }
+        if index_mode == "chunked":
+            for section, text in chunk_recipe(r.content):
+                texts.append(section_text(r.title, section, text))
+                notes.append({**base, "section": section, "content": text})
+        else:
+            texts.append(f"{r.title}\n\n{r.content}")
+            notes.append({**base, "content": r.content})
+    return texts, notes
+
+def fingerprint(recipes: Iterable[Recipe], *scope: Any) -> str:
+    """Identifies one ingestion job, so a checkpoint is only resumed for the same input."""
+    h = hashlib.sha256(repr(scope).encode("utf-8"))
+    for r in recipes:
+        h.update(f"{r.id}:{recipe_hash(r)}\n".encode("utf-8"))
+    return h.hexdigest()
+
+class IngestCheckpoint:
+    """JSON watermark: every batch below `committed` is durably stored."""
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+
+    def resume_point(self, fingerprint: str, batch_size: int) -> int:
+        if not self.path.exists():
+            return 0
+        state = json.loads(self.path.read_text(encoding="utf-8"))
+        if state.get("fingerprint") != fingerprint or state.get("batch_size") != batch_size:
+            return 0
+        return int(state.get("committed", 0))
+
+    def save(self, fingerprint: str, batch_size: int, committed: int) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        state = {"fingerprint": fingerprint, "batch_size": batch_size, "committed": committed}
+        tmp.write_text(json.dumps(state), encoding="utf-8")
+        tmp.replace(self.path)
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+@dataclass
+class IngestStats:
+    recipes: int = 0
+    objects: int = 0
+    batches: int = 0
+    skipped: int = 0  # recipes already committed by an earlier, interrupted run
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.recipes / self.elapsed if self.elapsed > 0 else 0.0
+
+class ProgressPrinter:
+    """Progress callback that prints at most every `every_s` seconds."""
+
+    def __init__(self, every_s: float = 2.0, stream=sys.stderr) -> None:
+        self.every_s = every_s
+        self.stream = stream
+        self._last = time.perf_counter()
+
+    def __call__(self, stats: IngestStats) -> None:
+        now = time.perf_counter()
+        if now - self._last >= self.every_s:
+            self._last = now
+            resumed = f", {stats.skipped} resumed" if stats.skipped else ""
+            print(f"Ingested {stats.recipes} recipes ({stats.rate:.0f}/s{resumed})", file=self.stream, flush=True)
+
+_DONE = object()
+_STOPPED = object()
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
+class IngestPipeline:
+    """
+    Parse -> embed -> insert as overlapping stages joined by bounded queues.
+
+    Recipes are read (and turned into documents) on one thread, `embed_workers` threads
+    embed batches, and the calling thread inserts them, so throughput is bounded by the
+    slowest stage rather than the sum. With a checkpoint, the store is flushed every
+    `checkpoint_every` batches and the watermark saved; a rerun over the same input skips
+    the batches that were already committed.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        db,
+        to_documents: Callable[[List[Recipe]], Tuple[List[str], List[dict]]],
+        batch_size: int = 256,
+        embed_workers: int = 2,
+        queue_depth: int = 4,
+        checkpoint: Optional[IngestCheckpoint] = None,
+        checkpoint_every: int = 8,
+        progress: Optional[Callable[[IngestStats], None]] = None,
+    ) -> None:
+        self.embedder = embedder
+        self.db = db
+        self.to_documents = to_documents
+        self.batch_size = max(1, batch_size)
+        self.embed_workers = max(1, embed_workers)
+        self.queue_depth = max(1, queue_depth)
+        self.checkpoint = checkpoint
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.progress = progress
+
+    def run(self, recipes: Iterable[Recipe], fingerprint: str = "") -> IngestStats:
+        stats = IngestStats()
+        resume_from = self.checkpoint.resume_point(fingerprint, self.batch_size) if self.checkpoint else 0
+        embed_q: queue.Queue = queue.Queue(maxsize=self.queue_depth)
+        insert_q: queue.Queue = queue.Queue(maxsize=self.queue_depth)
+        stop = threading.Event()
+        errors: List[BaseException] = []
+
+        def fail(exc: BaseException) -> None:
+            errors.append(exc)
+            stop.set()
+
+        def put(q: queue.Queue, item) -> None:
+            while not stop.is_set():
+                try:
+                    return q.put(item, timeout=0.1)
+                except queue.Full:
+                    pass
+
+        def get(q: queue.Queue):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            return _STOPPED
+
+        def produce() -> None:
+            try:
+                for seq, batch in enumerate(batched(recipes, self.batch_size)):
+                    if stop.is_set():
+                        return
+                    if seq < resume_from:
+                        stats.skipped += len(batch)
+                        continue
+                    texts, notes = self.to_documents(batch)
+                    put(embed_q, (seq, len(batch), texts, notes))
+            except BaseException as exc:
+                fail(exc)
+            finally:
+                for _ in range(self.embed_workers):
+                    put(embed_q, _DONE)
+
+        def embed() -> None:
+            try:
+                while (item := get(embed_q)) not in (_DONE, _STOPPED):
+                    seq, n, texts, notes = item
+                    put(insert_q, (seq, n, notes, self.embedder.embed_texts(texts)))
+            except BaseException as exc:
+                fail(exc)
+            finally:
+                put(insert_q, _DONE)
+
+        threads = [threading.Thread(target=produce, name="ingest-parse", daemon=True)]
+        threads += [
+            threading.Thread(target=embed, name=f"ingest-embed-{i}", daemon=True) for i in range(self.embed_workers)
+        ]
+        for t in threads:
+            t.start()
+
+        # Batches can finish out of order; the watermark only advances over a contiguous prefix.
+        watermark, committed, unsaved = resume_from, set(), 0
+        try:
+            finished = 0
+            while finished < self.embed_workers:
+                item = get(insert_q)
+                if item is _STOPPED:
+                    break
+                if item is _DONE:
+                    finished += 1
+                    continue
+                seq, n, notes, vectors = item
+                self.db.insert(notes, vectors)
+                committed.add(seq)
+                while watermark in committed:
+                    committed.remove(watermark)
+                    watermark += 1
+                stats.recipes += n
+                stats.objects += len(notes)
+                stats.batches += 1
+                unsaved += 1
+                if self.checkpoint and unsaved >= self.checkpoint_every:
+                    self.db.flush()
+                    self.checkpoint.save(fingerprint, self.batch_size, watermark)
+                    unsaved = 0
+                if self.progress:
+                    self.progress(stats)
+        except BaseException as exc:
+            fail(exc)
+        finally:
+            stop.set()
+            for t in threads:
+                t.join()
+
+        if errors:
+            # Record whatever did make it in, so the next run resumes from there.
+            if self.checkpoint and unsaved:
+                self.db.flush()
+                self.checkpoint.save(fingerprint, self.batch_size, watermark)
+            raise errors[0]
+
+        self.db.flush()
+        if self.checkpoint:
+            self.checkpoint.clear()
+        return stats
+
+def main() -> None:
+    """Stream a (large) catalog into the configured vector store without starting the assistant."""
+    parser = argparse.ArgumentParser(description="Bulk-load recipes into the vector store")
+    parser.add_argument("path", nargs="?", help="recipes .json or .jsonl (default: RECIPES_PATH)")
+    parser.add_argument("--rebuild", action="store_true", help="drop the collection first (unless resuming)")
+    args = parser.parse_args()
+
+    settings = Settings()
+    path = args.path or settings.recipes_path
+    embedder = make_embedding_client(settings)
+    scope = index_scope(embedder, settings.index_mode)
+    # Recipes are streamed, so the job is identified by the file rather than its contents.
+    stat = Path(path).stat()
+    job = fingerprint((), scope, settings.vector_backend, str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns)
+    checkpoint = IngestCheckpoint(settings.ingest_checkpoint_path) if settings.ingest_checkpoint_path else None
+    resume = checkpoint is not None and checkpoint.resume_point(job, settings.ingest_batch_size) > 0
+
+    db = open_vector_db(settings, recreate=args.rebuild and not resume)
+    try:
+        pipeline = IngestPipeline(
+            embedder,
+            db,
+            lambda batch: recipe_documents(batch, settings.index_mode, scope),
+            batch_size=settings.ingest_batch_size,
+            embed_workers=settings.ingest_embed_workers,
+            queue_depth=settings.ingest_queue_depth,
+            checkpoint=checkpoint,
+            checkpoint_every=settings.ingest_checkpoint_every,
+            progress=ProgressPrinter(),
+        )
+        stats = pipeline.run(iter_recipes(path), fingerprint=job)
+    finally:
+        db.close()
+    resumed = f", {stats.skipped} already committed" if stats.skipped else ""
+    print(f"✅ Ingested {stats.recipes} recipes as {stats.objects} objects in {stats.elapsed:.1f}s ({stats.rate:.0f}/s{resumed})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import json
+import os
+import re
+from dataclasses import asdict, dataclass
+from fractions import Fraction
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from .models import Recipe
+from .recipes_loader import recipe_hash
+
+# Bump when parsing changes so persisted entries are re-parsed.
+PARSER_VERSION = 1
+
+# Units normalized to grams, millilitres or a count unit: alias -> (unit, factor).
+UNITS = {
+    "g": ("g", 1), "gram": ("g", 1), "grams": ("g", 1), "kg": ("g", 1000),
+    "ml": ("ml", 1), "l": ("ml", 1000), "liter": ("ml", 1000), "liters": ("ml", 1000), "litre": ("ml", 1000),
+    "tsp": ("ml", 5), "teaspoon": ("ml", 5), "teaspoons": ("ml", 5),
+    "tbsp": ("ml", 15), "tablespoon": ("ml", 15), "tablespoons": ("ml", 15),
+    "cup": ("ml", 240), "cups": ("ml", 240),
+    "clove": ("clove", 1), "cloves": ("clove", 1),
+    "pinch": ("pinch", 1), "pinches": ("pinch", 1),
+}
+
+# First match wins, so "canned tomatoes" is pantry before "tomato" makes it produce.
+CATEGORIES = [
+    ("pantry", ["canned", "pasta", "spaghetti", "penne", "fusilli", "rice", "oats", "flour", "sugar", "cocoa",
+                "honey", "oil", "soy sauce", "beans", "vanilla", "baking"]),
+    ("spices", ["salt", "pepper", "paprika", "cumin", "chili powder", "spice"]),
+    ("meat", ["chicken", "beef", "pork", "lamb", "turkey", "mince"]),
+    ("fish", ["salmon", "fish", "tuna", "cod", "shrimp"]),
+    ("dairy", ["cream", "butter", "parmesan", "cheese", "milk", "yogurt", "egg"]),
+    ("produce", ["garlic", "basil", "tomato", "onion", "lemon", "lime", "banana", "berr", "mushroom",
+                 "vegetable", "herb", "pepper", "carrot", "potato", "spinach", "apple"]),
+]
+
+# Preparation words that don't change what to buy ("grated parmesan" -> "parmesan").
+PREP_WORDS = {"fresh", "grated", "chopped", "finely", "minced", "torn"}
+
+_QTY = r"(?P<qty>\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?)"
+_LINE_RE = re.compile(rf"^{_QTY}?\s*(?P<rest>.*)$")
+_METRIC_RE = re.compile(rf"\(\s*{_QTY}\s*(?P<unit>g|kg|ml|l)\s*\)", re.IGNORECASE)
+
+@dataclass(frozen=True)
+class Ingredient:
+    name: str
+    quantity: Optional[float]   # None when the recipe gives no amount
+    unit: str                   # "g", "ml", "clove", "pinch" or "" for a plain count
+    category: str
+
+def _number(text: str) -> float:
+    return float(sum(Fraction(part) for part in text.split()))
+
+def _normalize(qty: float, unit: str) -> Tuple[float, str]:
+    base, factor = UNITS[unit.lower()]
+    return qty * factor, base
+
+def categorize(name: str) -> str:
+    for category, keywords in CATEGORIES:
+        if any(k in name for k in keywords):
+            return category
+    return "other"
+
+def parse_ingredient(line: str) -> Optional[Ingredient]:
+    """Parse one '- 2 tbsp olive oil (30 ml)' style line; a metric amount in brackets wins."""
+    text = line.strip().lstrip("-*• ").strip()
+    if not text:
+        return None
+
+    metric = _METRIC_RE.search(text)
+    text = re.sub(r"\([^)]*\)", "", text)
+    text = text.split(",", 1)[0].strip()
+
+    m = _LINE_RE.match(text)
+    qty = _number(m.group("qty")) if m.group("qty") else None
+    words = m.group("rest").split()
+    unit = ""
+    if qty is not None and words and words[0].lower() in UNITS:
+        qty, unit = _normalize(qty, words.pop(0))
+    if metric:
+        qty, unit = _normalize(_number(metric.group("qty")), metric.group("unit"))
+
+    name = " ".join(w for w in words if w.lower() not in PREP_WORDS).lower()
+    if not name:
+        return None
+    return Ingredient(name=name, quantity=qty, unit=unit, category=categorize(name))
+
+def parse_ingredients(content: str) -> List[Ingredient]:
+    """Structured records for the lines under the recipe's 'Ingredients:' header."""
+    if "Ingredients:" not in content:
+        return []
+    block = content.split("Ingredients:", 1)[1].split("Instructions:", 1)[0]
+    parsed = (parse_ingredient(line) for line in block.splitlines() if line.strip().startswith(("-", "*", "•")))
+    return [i for i in parsed if i is not None]
+
+def _format(name: str, qty: Optional[float], unit: str) -> str:
+    if qty is None:
+        return name
+    if unit in {"g", "ml"} and qty >= 1000:
+        qty, unit = qty / 1000, {"g": "kg", "ml": "l"}[unit]
+    amount = f"{qty:g}" if qty == int(qty) else f"{qty:.1f}"
+    if unit == "clove":
+        unit = "clove" if qty == 1 else "cloves"
+    return f"{amount} {unit} {name}" if unit else f"{amount} {name}"
+
+def grocery_list(ingredient_lists: Iterable[Sequence[Ingredient]]) -> Dict[str, List[str]]:
+    """Merge ingredients by (name, unit), summing quantities; grouped by category."""
+    totals: Dict[Tuple[str, str], Optional[float]] = {}
+    categories: Dict[str, str] = {}
+    for ingredients in ingredient_lists:
+        for i in ingredients:
+            key = (i.name, i.unit)
+            categories[i.name] = i.category
+            if i.quantity is None:
+                totals.setdefault(key, None)
+            else:
+                totals[key] = (totals.get(key) or 0.0) + i.quantity
+
+    # An unmeasured mention of something already measured elsewhere folds into that line.
+    measured = {name for (name, _), qty in totals.items() if qty is not None}
+    out: Dict[str, List[str]] = {}
+    for (name, unit), qty in sorted(totals.items()):
+        if qty is None and name in measured:
+            continue
+        line = _format(name, qty, unit)
+        if qty is not None and (name, "") in totals and totals[(name, "")] is None:
+            line += " (+ more)"
+        out.setdefault(categories[name], []).append(line)
+    return dict(sorted(out.items()))
+
+class IngredientStore:
+    """
+    Parsed ingredients per recipe, persisted as a JSON sidecar next to the index.
+    Entries are keyed by recipe id and re-parsed only when the recipe's hash changes.
+    """
+
+    def __init__(self, path: Optional[str]) -> None:
+        self.path = Path(path) if path else None
+        self._entries: Dict[str, dict] = {}
+        if self.path is not None and self.path.exists():
+            self._entries = json.loads(self.path.read_text(encoding="utf-8"))
+        self.ingredients: Dict[str, List[Ingredient]] = {
+            rid: [Ingredient(**i) for i in e["ingredients"]] for rid, e in self._entries.items()
+        }
+
+    def sync(self, recipes: Iterable[Recipe]) -> Dict[str, List[Ingredient]]:
+        seen, changed = set(), False
+        for r in recipes:
+            seen.add(r.id)
+            h = f"{PARSER_VERSION}:{recipe_hash(r)}"
+            if self._entries.get(r.id, {}).get("hash") == h:
+                continue
+            parsed = parse_ingredients(r.content)
+            self._entries[r.id] = {"hash": h, "ingredients": [asdict(i) for i in parsed]}
+            self.ingredients[r.id] = parsed
+            changed = True
+        for rid in set(self._entries) - seen:
+            del self._entries[rid]
+            self.ingredients.pop(rid, None)
+            changed = True
+        if changed:
+            self._save()
+        return self.ingredients
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self._entries, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
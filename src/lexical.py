@@ -0,0 +1,150 @@
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from .filters import MetadataFilter, matches
+from .models import HitMetadata, SearchHit, SearchResults, object_key
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it my of on or should "
+    "the to what when which with you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+def bm25_scores(query: Sequence[str], docs: Sequence[Sequence[str]], k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """Okapi BM25 of one tokenized query against a small tokenized document set."""
+    n = len(docs)
+    if n == 0:
+        return []
+    avgdl = sum(len(d) for d in docs) / n or 1.0
+    df = Counter(t for d in docs for t in set(d))
+    terms = set(query)
+
+    scores = []
+    for d in docs:
+        tf = Counter(d)
+        norm = k1 * (1 - b + b * len(d) / avgdl)
+        score = 0.0
+        for t in terms:
+            if tf[t]:
+                idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+                score += idf * tf[t] * (k1 + 1) / (tf[t] + norm)
+        scores.append(score)
+    return scores
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]], k: int = 60, weights: Optional[Sequence[float]] = None
+) -> List[str]:
+    """Fuse several ranked id lists (optionally weighted); ties keep first-seen order."""
+    weights = weights or [1.0] * len(rankings)
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank + 1)
+    return sorted(scores, key=lambda item: -scores[item])
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over title + content of stored objects.
+    With ngram > 0, every word also contributes padded character n-grams, so misspelled
+    queries ("tommato spageti") still share terms with the right document.
+    Postings are rebuilt lazily after any upsert/delete.
+    """
+
+    def __init__(self, ngram: int = 3, title_weight: int = 2, k1: float = 1.5, b: float = 0.75) -> None:
+        self.ngram = ngram
+        self.title_weight = title_weight
+        self.k1 = k1
+        self.b = b
+        self._docs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._stale = True
+        self._keys: List[str] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._lengths: List[int] = []
+        self._avgdl = 1.0
+
+    def terms(self, text: str) -> List[str]:
+        words = tokenize(text)
+        if self.ngram <= 0:
+            return words
+        out = list(words)
+        for w in words:
+            padded = f"#{w}#"
+            if len(padded) > self.ngram:
+                # "~" keeps n-grams from colliding with real short words.
+                out.extend("~" + padded[i : i + self.ngram] for i in range(len(padded) - self.ngram + 1))
+        return out
+
+    def upsert(self, docs: Iterable[dict]) -> None:
+        with self._lock:
+            for props in docs:
+                self._docs[object_key(props)] = props
+            self._stale = True
+
+    def delete_notes(self, note_ids: Iterable[str]) -> None:
+        doomed = set(note_ids)
+        with self._lock:
+            for key in [k for k, p in self._docs.items() if p["note_id"] in doomed]:
+                del self._docs[key]
+            self._stale = True
+
+    def _rebuild(self) -> None:
+        self._keys = list(self._docs)
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+        for i, key in enumerate(self._keys):
+            p = self._docs[key]
+            terms = self.terms(p.get("title", "")) * self.title_weight + self.terms(p.get("content", ""))
+            lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings.setdefault(term, []).append((i, tf))
+        self._postings = postings
+        self._lengths = lengths
+        self._avgdl = (sum(lengths) / len(lengths)) if lengths else 1.0
+        self._stale = False
+
+    def search(self, query: str, k: int, filters: Optional[Sequence[MetadataFilter]] = None) -> SearchResults:
+        with self._lock:
+            if self._stale:
+                self._rebuild()
+            n = len(self._keys)
+            scores: Dict[int, float] = {}
+            for term in set(self.terms(query)):
+                plist = self._postings.get(term)
+                if not plist:
+                    continue
+                idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+                for doc, tf in plist:
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc] / self._avgdl)
+                    scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: -item[1])
+            hits = []
+            for doc, score in ranked:
+                props = self._docs[self._keys[doc]]
+                if not matches(props, filters):
+                    continue
+                hits.append(SearchHit(properties=dict(props), metadata=HitMetadata(score=score)))
+                if len(hits) == k:
+                    break
+            return SearchResults(objects=hits)
+
+def fuse_results(vector: SearchResults, lexical: SearchResults, limit: int, rrf_k: int = 60) -> SearchResults:
+    """Reciprocal-rank fusion of vector and lexical hits; vector hits keep their distances."""
+    objects: Dict[str, object] = {}
+    rankings = []
+    for results in (vector, lexical):
+        ranking = []
+        for obj in results.objects:
+            key = object_key(obj.properties)
+            objects.setdefault(key, obj)
+            ranking.append(key)
+        rankings.append(ranking)
+    fused = reciprocal_rank_fusion(rankings, k=rrf_k)
+    return SearchResults(objects=[objects[key] for key in fused[:limit]])
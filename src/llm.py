@@ -1,18 +1,58 @@
 import textwrap
+import time
 from dataclasses import dataclass
-from openai import OpenAI
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+from .cassette import openai_client
+from .config import Settings
+from .context_packer import ContextPacker, PackedContext
+from .tracing import Trace
+
+class StreamedAnswer:
+    """
+    Iterate to receive completion tokens as they arrive.
+    After iteration, `text` holds the full answer; `ttft` and `total_time` are in seconds
+    measured from `started` (defaults to when the request was sent).
+    `on_complete`, if given, receives the full text once the stream is exhausted.
+    """
+
+    def __init__(
+        self,
+        tokens: Iterable[str],
+        started: Optional[float] = None,
+        on_complete: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self._tokens = tokens
+        self.on_complete = on_complete
+        self.started = time.perf_counter() if started is None else started
+        self.ttft: Optional[float] = None
+        self.total_time: Optional[float] = None
+        self.text = ""
+
+    def __iter__(self) -> Iterator[str]:
+        parts: List[str] = []
+        for token in self._tokens:
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self.started
+            parts.append(token)
+            yield token
+        self.total_time = time.perf_counter() - self.started
+        self.text = "".join(parts).strip()
+        if self.on_complete is not None:
+            self.on_complete(self.text)
 
 @dataclass
 class OpenAIChatClient:
     model: str
-    max_context_chars: int = 8000
+    max_context_tokens: int = 0  # 0 = per-model default budget
+    max_retries: Optional[int] = None  # None = SDK default
+    settings: Optional[Settings] = None  # cassette mode/path; None reads the environment
 
     def __post_init__(self) -> None:
-        self.client = OpenAI()
+        self.client = openai_client(self.settings, max_retries=self.max_retries)
+        self.packer = ContextPacker(self.model, self.max_context_tokens)
 
-    def rag_answer(self, context: str, question: str) -> str:
-        if len(context) > self.max_context_chars:
-            context = context[: self.max_context_chars]
+    def _rag_messages(self, context: Union[str, PackedContext], question: str) -> List[dict]:
+        context = self.packer.pack_text(context).text
 
         system_prompt = textwrap.dedent(
             """
@@ -27,31 +67,89 @@ class OpenAIChatClient:
         ).strip()
 
         user_content = f"CONTEXT:\n{context}\n\nQUESTION:\n{question}"
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content},
+        ]
+
+    @staticmethod
+    def _baseline_messages(question: str) -> List[dict]:
+        return [
+            {"role": "system", "content": (
+                "You are a casual home-cooking advisor.\n"
+                "- Give only high-level, generic advice.\n"
+                "- DO NOT mention exact gram weights, milliliters, temperatures or times.\n"
+                "- Use phrases like 'a bit of', 'some', 'for a few minutes', etc.\n"
+                "- Do NOT give numbered step-by-step instructions.\n"
+                "- Keep answers short: 3–5 sentences."
+            )},
+            {"role": "user", "content": question},
+        ]
 
+    @staticmethod
+    def _record_usage(trace: Optional[Trace], usage) -> None:
+        if trace is not None and usage is not None:
+            trace.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+
+    def _complete(self, messages: List[dict], trace: Optional[Trace] = None) -> str:
         resp = self.client.chat.completions.create(
             model=self.model,
             temperature=0.0,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content},
-            ],
+            messages=messages,
         )
+        self._record_usage(trace, resp.usage)
         return resp.choices[0].message.content.strip()
 
-    def answer_without_context(self, question: str) -> str:
-        resp = self.client.chat.completions.create(
+    def _stream(
+        self, messages: List[dict], started: Optional[float] = None, trace: Optional[Trace] = None
+    ) -> StreamedAnswer:
+        started = time.perf_counter() if started is None else started
+        stream = self.client.chat.completions.create(
             model=self.model,
             temperature=0.0,
-            messages=[
-                {"role": "system", "content": (
-                    "You are a casual home-cooking advisor.\n"
-                    "- Give only high-level, generic advice.\n"
-                    "- DO NOT mention exact gram weights, milliliters, temperatures or times.\n"
-                    "- Use phrases like 'a bit of', 'some', 'for a few minutes', etc.\n"
-                    "- Do NOT give numbered step-by-step instructions.\n"
-                    "- Keep answers short: 3–5 sentences."
-                )},
-                {"role": "user", "content": question},
-            ],
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
         )
-        return resp.choices[0].message.content.strip()
+
+        def tokens() -> Iterator[str]:
+            for chunk in stream:
+                # With include_usage, the final chunk has no choices, only token counts.
+                if chunk.usage is not None:
+                    self._record_usage(trace, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+        return StreamedAnswer(tokens(), started=started)
+
+    def rag_answer(
+        self, context: Union[str, PackedContext], question: str, trace: Optional[Trace] = None
+    ) -> str:
+        return self._complete(self._rag_messages(context, question), trace=trace)
+
+    def rag_answer_stream(
+        self,
+        context: Union[str, PackedContext],
+        question: str,
+        started: Optional[float] = None,
+        trace: Optional[Trace] = None,
+    ) -> StreamedAnswer:
+        return self._stream(self._rag_messages(context, question), started=started, trace=trace)
+
+    def phrase_plan(self, plan_text: str) -> str:
+        messages = [
+            {"role": "system", "content": (
+                "You present weekly family meal plans.\n"
+                "- Rewrite the PLAN as a friendly day-by-day summary with short cooking notes.\n"
+                "- Use only the recipes and times in PLAN; never add, drop, or swap a meal.\n"
+                "- Copy the grocery list exactly, keeping its categories and amounts."
+            )},
+            {"role": "user", "content": f"PLAN:\n{plan_text}"},
+        ]
+        return self._complete(messages)
+
+    def answer_without_context(self, question: str) -> str:
+        return self._complete(self._baseline_messages(question))
+
+    def answer_without_context_stream(self, question: str) -> StreamedAnswer:
+        return self._stream(self._baseline_messages(question))
@@ -0,0 +1,440 @@
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from .filters import MetadataFilter
+from .models import HitMetadata, SearchHit, SearchResults, object_key
+
+# Storage types for the row matrix; int8 rows carry a per-row float32 scale.
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+# Rows scored per matmul, so quantized rows are widened to float32 a block at a time.
+SCORE_BLOCK = 65536
+# On-disk layout: 3 = append-only row files and object log with tombstones (older layouts are rewritten on load).
+FORMAT = 3
+
+class LocalVectorDb:
+    """
+    In-process cosine index with the same surface as VectorDb.
+
+    Vectors are L2-normalized rows of one contiguous matrix, so a search is a blocked
+    matmul plus argpartition. `dtype` float16 halves and int8 quarters the memory of the
+    float32 default.
+
+    With a path, rows live in a memory-mapped <collection>.<generation>.vec file (plus
+    .scale.vec for int8) that only grows: inserts append in place, and deletes or
+    overwrites leave tombstones until dead rows outnumber live ones and the rest is
+    compacted into a new generation. Objects go to an append-only <generation>.objects.jsonl
+    log, so a flush writes only what changed since the last one. <collection>.meta.json names
+    the generation and the committed row count and log length, so replacing it is the
+    single commit point of a flush.
+    """
+
+    def __init__(
+        self, path: Optional[str], collection_name: str, recreate: bool = True, dtype: str = "float32"
+    ) -> None:
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown local vector dtype: {dtype!r}")
+        self.collection_name = collection_name
+        self.dtype = dtype
+        self._dir = Path(path) if path else None
+        self._buf: Optional[np.ndarray] = None
+        self._scale: Optional[np.ndarray] = None
+        self._n = 0                            # rows in use, live or dead
+        self._props: List[Optional[dict]] = []  # per row; None once the row is dead
+        self._alive = np.zeros(0, dtype=bool)
+        self._dead = 0
+        self._row_of: Dict[str, int] = {}
+        # field -> value -> row indices; rebuilt lazily after any mutation.
+        self._field_index: Dict[str, Dict[str, np.ndarray]] = {}
+        self._dirty = False
+        self._generation = 1  # generation new rows are written to
+        # Object log lines not yet written, and the committed length of the working generation's log.
+        self._pending: List[str] = []
+        self._pending_dead: List[int] = []
+        self._log_bytes = 0
+
+        if self._dir is not None:
+            self._meta_path = self._dir / f"{collection_name}.meta.json"
+            if recreate:
+                self._meta_path.unlink(missing_ok=True)
+                self._remove_generations(keep=None)
+            elif self._meta_path.exists():
+                self._load()
+
+    # ---------- persistence ----------
+
+    def _path(self, generation: int, kind: str) -> Path:
+        return self._dir / f"{self.collection_name}.{generation}.{kind}"
+
+    def _remove_generations(self, keep: Optional[int]) -> None:
+        # Also matches the older <collection>[.<generation>][.scale].npy layouts.
+        pattern = re.compile(rf"{re.escape(self.collection_name)}(?:\.(\d+))?(?:\.scale)?\.(?:npy|vec|objects\.jsonl)")
+        for p in self._dir.glob(f"{self.collection_name}.*"):
+            m = pattern.fullmatch(p.name)
+            if m and (keep is None or int(m.group(1) or 0) != keep):
+                p.unlink(missing_ok=True)
+
+    def _storage(self, kind: str, dtype, shape: Tuple[int, ...]) -> np.ndarray:
+        """Zeroed rows in RAM, or the working generation's file grown to `shape` and memory-mapped."""
+        if self._dir is None:
+            return np.zeros(shape, dtype=dtype)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(self._generation, kind)
+        with open(path, "r+b" if path.exists() else "w+b") as f:
+            f.truncate(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _map(self, kind: str, dtype, dim: int = 0) -> Optional[np.memmap]:
+        path = self._path(self._generation, kind)
+        if not path.exists():
+            return None
+        rows = path.stat().st_size // (np.dtype(dtype).itemsize * max(dim, 1))
+        return np.memmap(path, dtype=dtype, mode="r+", shape=(rows, dim) if dim else (rows,))
+
+    def _load(self) -> None:
+        meta = json.loads(self._meta_path.read_text(encoding="utf-8"))
+        self._generation = meta.get("generation", 0)
+        fmt = meta.get("format", 1)
+        objects = self._read_log(meta["log_bytes"]) if fmt >= 3 else meta["objects"]
+        rows = meta.get("rows", len(objects))
+        if not rows:
+            self._log_bytes = meta.get("log_bytes", 0)
+            return
+        stored = meta.get("dtype", "float32")
+        current = fmt == FORMAT
+        if fmt >= 2:
+            buf = self._map("vec", DTYPES[stored], meta["dim"])
+            scale = self._map("scale.vec", np.float32) if stored == "int8" else None
+        else:
+            suffix = f".{self._generation}" if self._generation else ""
+            buf = np.load(self._dir / f"{self.collection_name}{suffix}.npy", mmap_mode="r")
+            scale = np.load(self._dir / f"{self.collection_name}{suffix}.scale.npy") if stored == "int8" else None
+        # Rows and objects are matched by position, so any disagreement means a damaged index.
+        # Row files may run past the committed count (capacity, or appends that were never committed).
+        have = -1 if buf is None else buf.shape[0]
+        if (have < rows if fmt >= 2 else have != rows) or len(objects) != rows or (
+            stored == "int8" and (scale is None or len(scale) < rows)
+        ):
+            raise ValueError(
+                f"Local index {self.collection_name!r} is inconsistent ({max(have, 0)} vectors, "
+                f"{len(objects)} objects); rebuild it with INGEST_MODE=rebuild"
+            )
+
+        self._buf, self._scale, self._n = buf, scale, rows
+        self._props = objects
+        self._alive = np.zeros(buf.shape[0], dtype=bool)
+        self._alive[:rows] = [p is not None for p in objects]
+        self._dead = rows - int(self._alive.sum())
+        self._row_of = {object_key(p): i for i, p in enumerate(objects) if p is not None}
+        self._log_bytes = meta.get("log_bytes", 0)
+        if not current or stored != self.dtype:
+            # Older layouts and other dtypes are rewritten into a new generation, committed on flush.
+            self._rewrite(stored, np.flatnonzero(self._alive[:rows]))
+
+    def _read_log(self, length: int) -> List[Optional[dict]]:
+        """Objects by row from the first `length` (committed) bytes of the working generation's log."""
+        path = self._path(self._generation, "objects.jsonl")
+        if not path.exists() or path.stat().st_size < length:
+            raise ValueError(
+                f"Local index {self.collection_name!r} is missing object log entries; rebuild it with INGEST_MODE=rebuild"
+            )
+        with open(path, "rb") as f:
+            data = f.read(length)
+        objects: List[Optional[dict]] = []
+        for line in data.splitlines():
+            entry = json.loads(line)
+            if "dead" in entry:
+                for row in entry["dead"]:
+                    objects[row] = None
+            else:
+                objects.append(entry["object"])
+        return objects
+
+    def _log_object(self, props: dict) -> None:
+        if self._dir is not None:
+            self._pending.append(json.dumps({"object": props}, ensure_ascii=False))
+
+    def _rewrite(self, source_dtype: str, keep: np.ndarray) -> None:
+        """Copy the `keep` rows into fresh storage (a new generation on disk), re-encoding if needed."""
+        src, src_scale = self._buf, self._scale
+        dim = src.shape[1]
+        self._generation += 1
+        cap = max(len(keep) * 2, 64)
+        buf = self._storage("vec", DTYPES[self.dtype], (cap, dim))
+        scale = self._storage("scale.vec", np.float32, (cap,)) if self.dtype == "int8" else None
+        for start in range(0, len(keep), SCORE_BLOCK):
+            rows = keep[start : start + SCORE_BLOCK]
+            end = start + len(rows)
+            if source_dtype == self.dtype:
+                buf[start:end] = src[rows]
+                if scale is not None:
+                    scale[start:end] = src_scale[rows]
+            else:
+                codes, scales = self._encode(self._decode(src[rows], src_scale[rows] if src_scale is not None else None))
+                buf[start:end] = codes
+                if scale is not None:
+                    scale[start:end] = scales
+
+        self._buf, self._scale = buf, scale
+        self._props = [self._props[i] for i in keep]
+        self._n, self._dead = len(keep), 0
+        self._alive = np.zeros(cap, dtype=bool)
+        self._alive[: self._n] = True
+        self._row_of = {object_key(p): i for i, p in enumerate(self._props)}
+        self._field_index = {}
+        # The new generation starts its own log with just the live objects.
+        self._pending, self._pending_dead, self._log_bytes = [], [], 0
+        for props in self._props:
+            self._log_object(props)
+        self._dirty = True
+
+    def _maybe_compact(self) -> None:
+        if self._dead and self._dead >= self._n - self._dead:
+            self._rewrite(self.dtype, np.flatnonzero(self._alive[: self._n]))
+
+    def flush(self) -> None:
+        if self._dir is None or not self._dirty:
+            return
+        self._dir.mkdir(parents=True, exist_ok=True)
+
+        # Committed rows and log bytes are never rewritten in place, so once the new ones are
+        # on disk, swapping the sidecar commits them; a crash leaves the previous commit intact.
+        for rows in (self._buf, self._scale):
+            if isinstance(rows, np.memmap):
+                rows.flush()
+        if self._pending_dead:
+            self._pending.append(json.dumps({"dead": self._pending_dead}))
+        if self._pending:
+            path = self._path(self._generation, "objects.jsonl")
+            with open(path, "r+b" if path.exists() else "w+b") as f:
+                # Drop anything an interrupted flush appended past the last commit.
+                f.seek(self._log_bytes)
+                f.write("".join(line + "\n" for line in self._pending).encode("utf-8"))
+                f.truncate()
+                self._log_bytes = f.tell()
+            self._pending, self._pending_dead = [], []
+        tmp_meta = self._meta_path.with_name(self._meta_path.name + ".tmp")
+        meta = {
+            "collection": self.collection_name,
+            "format": FORMAT,
+            "generation": self._generation,
+            "dtype": self.dtype,
+            "dim": self._buf.shape[1] if self._buf is not None else 0,
+            "rows": self._n,
+            "log_bytes": self._log_bytes,
+        }
+        tmp_meta.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_meta, self._meta_path)
+        self._remove_generations(keep=self._generation)
+        self._dirty = False
+
+    def close(self) -> None:
+        self.flush()
+
+    # ---------- helpers ----------
+
+    @property
+    def _vectors(self) -> np.ndarray:
+        if self._buf is None:
+            return np.empty((0, 0), dtype=DTYPES[self.dtype])
+        return self._buf[: self._n]
+
+    @property
+    def index_bytes(self) -> int:
+        """Memory taken by the stored vectors (and int8 scales)."""
+        scale = self._n * 4 if self._scale is not None else 0
+        return self._vectors.nbytes + scale
+
+    def _encode(self, mat: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.dtype == "int8":
+            scale = np.abs(mat).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            return np.round(mat / scale[:, None]).astype(np.int8), scale.astype(np.float32)
+        return mat.astype(DTYPES[self.dtype]), None
+
+    @staticmethod
+    def _decode(codes: np.ndarray, scale: Optional[np.ndarray]) -> np.ndarray:
+        mat = np.asarray(codes, dtype=np.float32)
+        return mat * scale[:, None] if scale is not None else mat
+
+    def _scores(self, q: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Cosine of each query against all stored rows (or just `rows`), one block at a time."""
+        n = self._n if rows is None else len(rows)
+        if self.dtype == "float32" and rows is None:
+            return q @ self._vectors.T
+        out = np.empty((q.shape[0], n), dtype=np.float32)
+        for start in range(0, n, SCORE_BLOCK):
+            end = min(start + SCORE_BLOCK, n)
+            idx = slice(start, end) if rows is None else rows[start:end]
+            out[:, start:end] = q @ np.asarray(self._buf[idx], dtype=np.float32).T
+            if self._scale is not None:
+                # Scaling the scores is cheaper than decoding the rows.
+                out[:, start:end] *= self._scale[idx]
+        return out
+
+    @staticmethod
+    def _normalize(mat: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return mat / norms
+
+    def _reserve(self, extra: int, dim: int) -> None:
+        """Grow the row buffer geometrically; a file-backed one is extended in place, not copied into RAM."""
+        if self._n == 0 and self._buf is not None:
+            # An emptied index takes whatever dimension comes next, in a fresh generation.
+            self._buf, self._scale = None, None
+            self._generation += 1
+            self._pending, self._pending_dead, self._log_bytes = [], [], 0
+        if self._buf is not None and self._buf.shape[1] != dim:
+            raise ValueError(f"Vector dimension {dim} does not match index dimension {self._buf.shape[1]}")
+        need = self._n + extra
+        if self._buf is not None and need <= self._buf.shape[0]:
+            return
+        cap = max(need * 2, 64)
+        buf = self._storage("vec", DTYPES[self.dtype], (cap, dim))
+        scale = self._storage("scale.vec", np.float32, (cap,)) if self.dtype == "int8" else None
+        if self._dir is None and self._n:
+            buf[: self._n] = self._vectors
+            if scale is not None:
+                scale[: self._n] = self._scale[: self._n]
+        alive = np.zeros(cap, dtype=bool)
+        alive[: self._n] = self._alive[: self._n]
+        self._buf, self._scale, self._alive = buf, scale, alive
+
+    def _kill(self, row: int) -> None:
+        if self._dir is not None:
+            self._pending_dead.append(row)
+        del self._row_of[object_key(self._props[row])]
+        self._props[row] = None
+        self._alive[row] = False
+        self._dead += 1
+
+    def _hits(self, rows: np.ndarray, scores: np.ndarray) -> SearchResults:
+        return SearchResults(
+            objects=[
+                SearchHit(properties=dict(self._props[r]), metadata=HitMetadata(distance=float(1.0 - s)))
+                for r, s in zip(rows, scores)
+            ]
+        )
+
+    def _rows_for(self, field: str) -> Dict[str, np.ndarray]:
+        index = self._field_index.get(field)
+        if index is None:
+            rows: Dict[str, List[int]] = {}
+            for i, p in enumerate(self._props):
+                if p is None:
+                    continue
+                values = p.get(field)
+                for v in values if isinstance(values, list) else [values]:
+                    rows.setdefault(v, []).append(i)
+            index = {v: np.asarray(r, dtype=np.int64) for v, r in rows.items()}
+            self._field_index[field] = index
+        return index
+
+    def _candidates(self, filters: Optional[Sequence[MetadataFilter]]) -> Optional[np.ndarray]:
+        """Live row ids that pass every filter, or None when every row qualifies."""
+        if not filters and not self._dead:
+            return None
+        mask = self._alive[: self._n].copy()
+        for f in filters or ():
+            rows = self._rows_for(f.field).get(f.value, np.empty(0, dtype=np.int64))
+            if f.negate:
+                mask[rows] = False
+            else:
+                hit = np.zeros(self._n, dtype=bool)
+                hit[rows] = True
+                mask &= hit
+        return np.flatnonzero(mask)
+
+    def vectors_for(self, keys: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Stored (unit-length) vectors for the given object keys, and a mask of which exist."""
+        rows = np.array([self._row_of.get(k, -1) for k in keys], dtype=np.int64)
+        found = rows >= 0
+        dim = self._buf.shape[1] if self._buf is not None else 0
+        out = np.zeros((len(keys), dim), dtype=np.float32)
+        if found.any():
+            hit = rows[found]
+            out[found] = self._decode(self._buf[hit], self._scale[hit] if self._scale is not None else None)
+        return out, found
+
+    # ---------- VectorDb surface ----------
+
+    def is_empty(self) -> bool:
+        return self._n == 0
+
+    def note_hashes(self) -> Dict[str, str]:
+        return {p["note_id"]: p.get("content_hash", "") for p in self._props if p is not None}
+
+    def delete_notes(self, note_ids: Iterable[str]) -> None:
+        doomed = set(note_ids)
+        if not doomed:
+            return
+        rows = [i for i, p in enumerate(self._props) if p is not None and p["note_id"] in doomed]
+        if not rows:
+            return
+        for row in rows:
+            self._kill(row)
+        self._field_index = {}
+        self._dirty = True
+        self._maybe_compact()
+
+    def insert(self, notes: List[dict], vectors: List[List[float]]) -> None:
+        """Upsert: rows are always appended, and an existing copy of a note's key is tombstoned."""
+        if not notes:
+            return
+        mat = self._normalize(np.asarray(vectors, dtype=np.float32))
+        self._reserve(len(notes), mat.shape[1])
+        codes, scales = self._encode(mat)
+        start, end = self._n, self._n + len(notes)
+        self._buf[start:end] = codes
+        if scales is not None:
+            self._scale[start:end] = scales
+        self._alive[start:end] = True
+        for row, rec in enumerate(notes, start):
+            props = dict(rec)
+            key = object_key(props)
+            if key in self._row_of:
+                self._kill(self._row_of[key])
+            self._props.append(props)
+            self._log_object(props)
+            self._row_of[key] = row
+        self._n = end
+        self._field_index = {}
+        self._dirty = True
+        self._maybe_compact()
+
+    def search(
+        self, vector: List[float], k: int, filters: Optional[Sequence[MetadataFilter]] = None
+    ) -> SearchResults:
+        return self.search_many([vector], k, filters=filters)[0]
+
+    def search_many(
+        self, vectors: List[List[float]], k: int, filters: Optional[Sequence[MetadataFilter]] = None
+    ) -> List[SearchResults]:
+        """
+        Answer a block of queries with one (q x d) @ (d x n) product.
+        Filters are applied first, so only matching rows are scored.
+        """
+        if not vectors:
+            return []
+        cand = self._candidates(filters)
+        n = self._n if cand is None else len(cand)
+        if n == 0:
+            return [SearchResults(objects=[]) for _ in vectors]
+
+        q = self._normalize(np.asarray(vectors, dtype=np.float32))
+        scores = self._scores(q, cand)
+        k = min(k, n)
+        idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(scores, idx, axis=1)
+        order = np.argsort(-top, axis=1)
+        rows = np.take_along_axis(idx, order, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        if cand is not None:
+            rows = cand[rows]
+        results = [self._hits(r, s) for r, s in zip(rows, top)]
+        for res in results:
+            res.scanned = n
+        return results
@@ -0,0 +1,90 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+import numpy as np
+from .filters import MetadataFilter
+from .local_vector_db import LocalVectorDb
+from .models import HitMetadata, SearchHit, SearchResults, object_key
+
+def truncate(vectors, dims: int) -> np.ndarray:
+    """First `dims` components of each vector, re-normalized (what the API's `dimensions` returns); 0 keeps all."""
+    mat = np.asarray(vectors, dtype=np.float32)
+    if dims:
+        mat = mat[..., :dims]
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+class MatryoshkaVectorDb:
+    """
+    Two-stage search with the VectorDb surface.
+
+    `coarse` (Weaviate or local) indexes only the first `dims` dimensions of each embedding;
+    text-embedding-3 models are trained so those prefixes stay meaningful. `full` keeps the
+    full-size vectors on disk. A search pulls `rescore` x k candidates from the small index
+    and re-ranks them by full-dimension cosine, so distances match a full-size index.
+    With dims=0 nothing is truncated: the same rescoring then corrects a quantized coarse index.
+    """
+
+    def __init__(self, coarse, full: LocalVectorDb, dims: int, rescore: int = 4) -> None:
+        self.coarse = coarse
+        self.full = full
+        self.dims = dims
+        self.rescore = max(1, rescore)
+        self.collection_name = coarse.collection_name
+
+    def close(self) -> None:
+        self.full.close()
+        self.coarse.close()
+
+    def flush(self) -> None:
+        self.full.flush()
+        self.coarse.flush()
+
+    def is_empty(self) -> bool:
+        return self.coarse.is_empty()
+
+    def note_hashes(self) -> Dict[str, str]:
+        # A note missing its full vector (e.g. the side store was lost) reads as stale, so sync re-embeds it.
+        full = self.full.note_hashes()
+        return {note_id: h for note_id, h in self.coarse.note_hashes().items() if note_id in full}
+
+    def delete_notes(self, note_ids: Iterable[str]) -> None:
+        note_ids = list(note_ids)
+        self.coarse.delete_notes(note_ids)
+        self.full.delete_notes(note_ids)
+
+    def insert(self, notes: List[dict], vectors: List[List[float]]) -> None:
+        if not notes:
+            return
+        self.full.insert(notes, vectors)
+        self.coarse.insert(notes, truncate(vectors, self.dims).tolist())
+
+    def _rerank(self, query: np.ndarray, results, k: int) -> SearchResults:
+        objects = list(results.objects)
+        full, found = self.full.vectors_for([object_key(o.properties) for o in objects])
+        scores = full @ query if len(objects) else np.empty(0, dtype=np.float32)
+        # Anything missing from the side store keeps its first-stage similarity.
+        for i in np.flatnonzero(~found):
+            distance = objects[i].metadata.distance
+            scores[i] = 1.0 - (distance if distance is not None else 1.0)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return SearchResults(
+            objects=[
+                SearchHit(properties=objects[i].properties, metadata=HitMetadata(distance=float(1.0 - scores[i])))
+                for i in order
+            ],
+            scanned=getattr(results, "scanned", None),
+        )
+
+    def search(
+        self, vector: List[float], k: int, filters: Optional[Sequence[MetadataFilter]] = None
+    ) -> SearchResults:
+        return self.search_many([vector], k, filters=filters)[0]
+
+    def search_many(
+        self, vectors: List[List[float]], k: int, filters: Optional[Sequence[MetadataFilter]] = None
+    ) -> List[SearchResults]:
+        if not vectors:
+            return []
+        queries = LocalVectorDb._normalize(np.asarray(vectors, dtype=np.float32))
+        coarse = self.coarse.search_many(truncate(vectors, self.dims).tolist(), k * self.rescore, filters=filters)
+        return [self._rerank(q, res, k) for q, res in zip(queries, coarse)]
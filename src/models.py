@@ -1,7 +1,34 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
 
 @dataclass(frozen=True)
 class Recipe:
     id: str
     title: str
     content: str
+    tags: Tuple[str, ...] = ()
+    protein_source: str = ""
+    meal_type: Tuple[str, ...] = ()
+
+def object_key(props: Dict[str, Any]) -> str:
+    """Stable identity of a stored object: the note_id, plus the section for chunks."""
+    section = props.get("section")
+    return f"{props['note_id']}#{section}" if section else props["note_id"]
+
+# Search results mirror the shape of Weaviate's QueryReturn (objects -> properties/metadata),
+# so backends other than Weaviate can be consumed by the same RagApp code.
+@dataclass
+class HitMetadata:
+    distance: Optional[float] = None
+    score: Optional[float] = None
+
+@dataclass
+class SearchHit:
+    properties: Dict[str, Any]
+    metadata: HitMetadata = field(default_factory=HitMetadata)
+
+@dataclass
+class SearchResults:
+    objects: List[SearchHit]
+    # Number of stored vectors actually scored, when the backend knows it.
+    scanned: Optional[int] = None
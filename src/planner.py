@@ -1,15 +1,209 @@
+import random
+import re
 from dataclasses import dataclass
-from typing import List, Dict
+from typing import Dict, List, Optional, Sequence
+from .ingredients import Ingredient, grocery_list, parse_ingredients
+from .models import Recipe
+
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+MEALS = ("breakfast", "lunch", "dinner")
+
+# project_description.md, section 6: chicken and fish at most once a week, meat on the remaining dinners.
+DEFAULT_CONSTRAINTS = {
+    "max_chicken": 1,
+    "max_fish": 1,
+    "meat_dinners": True,     # dinners need a meat/fish protein
+    "max_minutes": 60,        # prep + cook time per meal
+    "max_repeats": 2,         # times the same dish may appear in a week
+    "no_consecutive": True,   # same dish not at the same meal on back-to-back days
+    "exclude": [],            # recipe ids to leave out
+    "seed": 0,                # varies the plan between weeks
+}
+LIMITED_PROTEINS = {"chicken": "max_chicken", "fish": "max_fish"}
+NON_MEAT = {"", "none", "other"}
+MAX_NODES = 200_000
+
+_TIME_RE = re.compile(r"^(Prep|Cook) time:\s*(\d+)\s*minutes?", re.IGNORECASE | re.MULTILINE)
+
+def recipe_minutes(content: str) -> Optional[int]:
+    """Prep + cook minutes from the recipe text, or None when neither is stated."""
+    found = [int(m.group(2)) for m in _TIME_RE.finditer(content)]
+    return sum(found) if found else None
 
 @dataclass
 class WeeklyPlan:
     days: List[Dict]          # [{"day": "Mon", "breakfast": "...", ...}, ...]
     grocery_list: Dict[str, List[str]]  # {"produce": [...], "meat": [...], ...}
 
+@dataclass(frozen=True)
+class _Candidate:
+    recipe: Recipe
+    dish: str          # duplicates of the same dish under different ids count as one
+    protein: str
+    minutes: Optional[int]
+
+class RecipeIndex:
+    """Recipes grouped by meal_type, then protein_source; built once per catalog."""
+
+    def __init__(self, recipes: Sequence[Recipe]) -> None:
+        self.by_meal: Dict[str, Dict[str, List[_Candidate]]] = {}
+        for r in recipes:
+            cand = _Candidate(r, r.title.strip().lower(), (r.protein_source or "").lower(), recipe_minutes(r.content))
+            for meal in r.meal_type:
+                self.by_meal.setdefault(meal, {}).setdefault(cand.protein, []).append(cand)
+
+    def candidates(self, meal: str) -> List[_Candidate]:
+        return [c for group in self.by_meal.get(meal, {}).values() for c in group]
+
 class Planner:
     """
-    Placeholder: will later compose a 7-day plan from retrieved recipes + constraints.
-    Keep it here so the architecture is ready without touching the RAG core.
+    Composes a 7-day breakfast/lunch/dinner plan from recipe metadata alone.
+
+    Slots are filled by backtracking over the precomputed index, most constrained meal
+    first, pruning a branch as soon as a protein cap, repeat limit or the remaining
+    capacity of any meal makes it unfinishable. No model call is needed to build the
+    plan; `describe` may use the LLM once to phrase it.
     """
-    def create_weekly_plan(self, constraints: dict) -> WeeklyPlan:
-        raise NotImplementedError("Planner mode not implemented yet.")
+
+    def __init__(
+        self, recipes: Sequence[Recipe], llm=None, ingredients: Optional[Dict[str, List[Ingredient]]] = None
+    ) -> None:
+        self.index = RecipeIndex(recipes)
+        self.llm = llm
+        # Parsed ingredients per recipe id (see IngredientStore); parsed here if not supplied.
+        self.ingredients = ingredients if ingredients is not None else {r.id: parse_ingredients(r.content) for r in recipes}
+
+    def _options(self, constraints: Optional[dict]) -> dict:
+        unknown = set(constraints or {}) - set(DEFAULT_CONSTRAINTS)
+        if unknown:
+            raise ValueError(f"Unknown planner constraints: {sorted(unknown)}")
+        return {**DEFAULT_CONSTRAINTS, **(constraints or {})}
+
+    def _eligible(self, meal: str, opts: dict) -> List[_Candidate]:
+        excluded = set(opts["exclude"])
+        out = []
+        for c in self.index.candidates(meal):
+            if c.recipe.id in excluded:
+                continue
+            if c.minutes is not None and c.minutes > opts["max_minutes"]:
+                continue
+            if meal == "dinner" and opts["meat_dinners"] and c.protein in NON_MEAT:
+                continue
+            if c.protein in LIMITED_PROTEINS and opts[LIMITED_PROTEINS[c.protein]] <= 0:
+                continue
+            out.append(c)
+        # One entry per dish: repeats are tracked per dish, so duplicates only widen the search.
+        unique = {c.dish: c for c in reversed(out)}
+        return list(reversed(unique.values()))
+
+    def create_weekly_plan(self, constraints: Optional[dict] = None) -> WeeklyPlan:
+        opts = self._options(constraints)
+        rng = random.Random(opts["seed"])
+        pools: Dict[str, List[_Candidate]] = {}
+        for meal in MEALS:
+            pool = self._eligible(meal, opts)
+            if not pool:
+                raise ValueError(f"No recipes can be used for {meal} under these constraints")
+            rng.shuffle(pool)
+            pools[meal] = pool
+
+        # Most constrained meal first, so dead ends show up near the root.
+        order = sorted(MEALS, key=lambda m: len(pools[m]))
+        slots = [(day, meal) for meal in order for day in range(len(DAYS))]
+        remaining = {meal: len(DAYS) for meal in MEALS}
+        caps = {p: opts[key] for p, key in LIMITED_PROTEINS.items()}
+        uses: Dict[str, int] = {}
+        grid: Dict[tuple, _Candidate] = {}
+        nodes = 0
+
+        def allowed(c: _Candidate, day: int, meal: str) -> bool:
+            if uses.get(c.dish, 0) >= opts["max_repeats"]:
+                return False
+            if caps.get(c.protein, 1) <= 0:
+                return False
+            if any(grid.get((day, m)) is not None and grid[(day, m)].dish == c.dish for m in MEALS):
+                return False
+            if opts["no_consecutive"]:
+                for d in (day - 1, day + 1):
+                    other = grid.get((d, meal))
+                    if other is not None and other.dish == c.dish:
+                        return False
+            return True
+
+        def feasible() -> bool:
+            # Relaxation: each meal must still have enough repeat/protein capacity left.
+            for meal, need in remaining.items():
+                if not need:
+                    continue
+                free, limited = 0, {p: 0 for p in caps}
+                for c in pools[meal]:
+                    left = opts["max_repeats"] - uses.get(c.dish, 0)
+                    if c.protein in caps:
+                        limited[c.protein] += left
+                    else:
+                        free += left
+                free += sum(min(n, caps[p]) for p, n in limited.items())
+                if free < need:
+                    return False
+            return True
+
+        def solve(i: int) -> bool:
+            nonlocal nodes
+            if i == len(slots):
+                return True
+            nodes += 1
+            if nodes > MAX_NODES:
+                raise ValueError("Planner search budget exhausted; relax the constraints")
+            day, meal = slots[i]
+            # Least-used dishes first spreads the week across the catalog.
+            for c in sorted(pools[meal], key=lambda c: uses.get(c.dish, 0)):
+                if not allowed(c, day, meal):
+                    continue
+                grid[(day, meal)] = c
+                uses[c.dish] = uses.get(c.dish, 0) + 1
+                remaining[meal] -= 1
+                if c.protein in caps:
+                    caps[c.protein] -= 1
+                if feasible() and solve(i + 1):
+                    return True
+                if c.protein in caps:
+                    caps[c.protein] += 1
+                remaining[meal] += 1
+                uses[c.dish] -= 1
+                del grid[(day, meal)]
+            return False
+
+        if not solve(0):
+            raise ValueError("No weekly plan satisfies these constraints")
+
+        days = []
+        for d, name in enumerate(DAYS):
+            row = {"day": name}
+            for meal in MEALS:
+                c = grid[(d, meal)]
+                row[meal] = c.recipe.title
+                row.setdefault("ids", {})[meal] = c.recipe.id
+                row.setdefault("minutes", {})[meal] = c.minutes
+            days.append(row)
+        chosen = [row["ids"][meal] for row in days for meal in MEALS]
+        return WeeklyPlan(days=days, grocery_list=grocery_list(self.ingredients.get(rid, []) for rid in chosen))
+
+    @staticmethod
+    def render(plan: WeeklyPlan) -> str:
+        lines = []
+        for row in plan.days:
+            meals = []
+            for meal in MEALS:
+                minutes = row.get("minutes", {}).get(meal)
+                meals.append(f"{meal}: {row[meal]}" + (f" ({minutes} min)" if minutes else ""))
+            lines.append(f"{row['day']} — " + "; ".join(meals))
+        if plan.grocery_list:
+            lines.append("\nGrocery list:")
+            for category, items in plan.grocery_list.items():
+                lines.append(f"  {category}: " + ", ".join(items))
+        return "\n".join(lines)
+
+    def describe(self, plan: WeeklyPlan) -> str:
+        """Plan as text; phrased by the LLM in a single call when one is configured."""
+        text = self.render(plan)
+        return self.llm.phrase_plan(text) if self.llm is not None else text
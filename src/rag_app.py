@@ -1,46 +1,333 @@
-from typing import Tuple, List
-from .embeddings import OpenAIEmbeddingClient
-from .llm import OpenAIChatClient
-from .vector_db import VectorDb
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence, Tuple, List
+from .answer_cache import AnswerCache
+from .embeddings import make_embedding_client
+from .llm import OpenAIChatClient, StreamedAnswer
+from .context_packer import PackedContext
+from .vector_store import open_vector_db
 from .recipes_loader import load_recipes
-from .models import Recipe
+from .models import Recipe, SearchResults
+from .chunking import aggregate_sections
+from .ingredients import IngredientStore
+from .ingest import (
+    IngestCheckpoint, IngestPipeline, ProgressPrinter, content_hash, fingerprint, index_scope, recipe_documents,
+)
+from .lexical import LexicalIndex, fuse_results
+from .relevance import best_distance, is_relevant
+from .rerank import make_reranker
+from .filters import MetadataFilter
 from .config import Settings
+from .tracing import HistogramSink, JsonlSink, Trace, Tracer
+
+NO_ANSWER = "I do not know based on the provided context."
 
 class RagApp:
-    def __init__(self, settings: Settings) -> None:
+    def __init__(self, settings: Settings, embedder=None, llm=None) -> None:
+        """`embedder` and `llm` override the clients built from settings (benchmarks, offline runs)."""
+        if settings.ingest_mode not in {"sync", "rebuild"}:
+            raise ValueError(f"Unknown INGEST_MODE: {settings.ingest_mode!r}")
+        if settings.index_mode not in {"recipe", "chunked"}:
+            raise ValueError(f"Unknown INDEX_MODE: {settings.index_mode!r}")
+        if settings.retrieval_mode not in {"vector", "hybrid"}:
+            raise ValueError(f"Unknown RETRIEVAL_MODE: {settings.retrieval_mode!r}")
         self.settings = settings
-        self.embedder = OpenAIEmbeddingClient(settings.embedding_model)
-        self.llm = OpenAIChatClient(settings.chat_model, max_context_chars=settings.max_context_chars)
-        self.db = VectorDb(
-            host=settings.weaviate_host,
-            http_port=settings.weaviate_http_port,
-            grpc_port=settings.weaviate_grpc_port,
-            collection_name=settings.collection_name,
+        self.embedder = embedder or make_embedding_client(settings)
+        self.llm = llm or OpenAIChatClient(
+            settings.chat_model, max_context_tokens=settings.max_context_tokens, settings=settings
         )
-
         recipes: List[Recipe] = load_recipes(settings.recipes_path)
+        self.recipes = recipes
+        # Ingredients are parsed once per recipe version, for grocery lists without re-parsing.
+        self.ingredients = IngredientStore(settings.ingredients_path)
+        self.ingredients.sync(recipes)
+        # A rebuild interrupted part-way keeps its collection and resumes from the checkpoint.
+        resume = settings.ingest_mode == "rebuild" and self._resume_point(recipes) > 0
+        self.db = open_vector_db(settings, recreate=settings.ingest_mode != "sync" and not resume)
+        self.reranker = make_reranker(settings.reranker)
 
-        if self.db.is_empty():
-            texts = [f"{r.title}\n\n{r.content}" for r in recipes]
-            vecs = self.embedder.embed_texts(texts)
+        # Hybrid mode keeps a BM25 index beside the vectors and searches both in parallel.
+        self.lexical: Optional[LexicalIndex] = None
+        if settings.retrieval_mode == "hybrid":
+            self.lexical = LexicalIndex(ngram=settings.lexical_ngram)
+            self._pool = ThreadPoolExecutor(max_workers=4)
 
-            notes = [{"note_id": r.id, "title": r.title, "content": r.content} for r in recipes]
-            self.db.insert(notes, vecs)
+        self.answer_cache: Optional[AnswerCache] = None
+        if settings.answer_cache_size > 0:
+            self.answer_cache = AnswerCache(
+                max_entries=settings.answer_cache_size,
+                ttl_seconds=settings.answer_cache_ttl_s,
+                similarity=settings.answer_cache_similarity,
+            )
 
-    @staticmethod
-    def _format_context(results) -> str:
-        chunks = []
+        # Every answer is traced; histograms are always kept, the JSONL log is opt-in.
+        self.metrics = HistogramSink()
+        sinks = [self.metrics] + ([JsonlSink(settings.trace_jsonl_path)] if settings.trace_jsonl_path else [])
+        self.tracer = Tracer(sinks)
+
+        if settings.ingest_mode == "sync":
+            self._sync(recipes)
+        elif resume or self.db.is_empty():
+            self._ingest(recipes)
+        self.db.flush()
+        self._index_lexical(recipes)
+
+    def close(self) -> None:
+        """Close the vector store and, in hybrid mode, the lexical search pool."""
+        if self.lexical is not None:
+            self._pool.shutdown()
+        self.db.close()
+
+    def reload(self) -> None:
+        """Re-read recipes.json and sync the index without restarting the process."""
+        recipes = load_recipes(self.settings.recipes_path)
+        self.recipes = recipes
+        self.ingredients.sync(recipes)
+        self._sync(recipes)
+        self.db.flush()
+        self._index_lexical(recipes)
+
+    def _index_lexical(self, recipes: List[Recipe]) -> None:
+        if self.lexical is not None:
+            self.lexical.upsert(self._documents(recipes)[1])
+
+    def _documents(self, recipes: List[Recipe]) -> Tuple[List[str], List[dict]]:
+        return recipe_documents(recipes, self.settings.index_mode, self._scope)
+
+    @property
+    def _scope(self) -> str:
+        return index_scope(self.embedder, self.settings.index_mode)
+
+    def _fingerprint(self, recipes: List[Recipe]) -> str:
+        return fingerprint(recipes, self._scope, self.settings.vector_backend)
+
+    def _checkpoint(self) -> Optional[IngestCheckpoint]:
+        path = self.settings.ingest_checkpoint_path
+        return IngestCheckpoint(path) if path else None
+
+    def _resume_point(self, recipes: List[Recipe]) -> int:
+        checkpoint = self._checkpoint()
+        if checkpoint is None:
+            return 0
+        return checkpoint.resume_point(self._fingerprint(recipes), self.settings.ingest_batch_size)
+
+    def _ingest(self, recipes: List[Recipe]) -> None:
+        if not recipes:
+            return
+        pipeline = IngestPipeline(
+            self.embedder,
+            self.db,
+            self._documents,
+            batch_size=self.settings.ingest_batch_size,
+            embed_workers=self.settings.ingest_embed_workers,
+            queue_depth=self.settings.ingest_queue_depth,
+            checkpoint=self._checkpoint(),
+            checkpoint_every=self.settings.ingest_checkpoint_every,
+            progress=ProgressPrinter(),
+        )
+        pipeline.run(recipes, fingerprint=self._fingerprint(recipes))
+
+    def _sync(self, recipes: List[Recipe]) -> None:
+        """Diff recipes against stored content hashes; only touch what changed."""
+        stored = self.db.note_hashes()
+        scope = self._scope
+        current = {r.id: content_hash(r, scope) for r in recipes}
+
+        # Changed notes are deleted and re-inserted so no stale copy survives.
+        stale = [note_id for note_id, h in stored.items() if current.get(note_id) != h]
+        if stored and len(stale) == len(stored):
+            # Nothing survives (e.g. EMBEDDING_MODEL changed): start from an empty collection,
+            # so vectors from the old model never share an index with the new ones.
+            self.db.close()
+            self.db = open_vector_db(self.settings, recreate=True)
+        else:
+            self.db.delete_notes(stale)
+        fresh = [r for r in recipes if stored.get(r.id) != current[r.id]]
+        if self.answer_cache is not None:
+            # A new or changed recipe may now outrank what any cached answer was grounded in,
+            # and exact hits skip retrieval; a pure removal only affects answers citing it.
+            if fresh:
+                self.answer_cache.clear()
+            else:
+                self.answer_cache.invalidate_notes(stale)
+        if self.lexical is not None:
+            self.lexical.delete_notes(stale)
+        self._ingest(fresh)
+
+    def _build_context(self, results) -> PackedContext:
+        sections = []
         for obj in results.objects:
             p = obj.properties
-            chunks.append(f"Title: {p['title']}\nContent: {p['content']}")
-        return "\n\n---\n\n".join(chunks)
+            sections.append(f"Title: {p['title']}\nContent: {p['content']}")
+        return self.llm.packer.pack(sections)
+
+    def _retrieve(
+        self,
+        question: str,
+        k: int,
+        filters: Optional[Sequence[MetadataFilter]],
+        trace: Trace,
+        qvec: Optional[List[float]] = None,
+    ) -> Tuple[List[float], SearchResults]:
+        """Embed (unless `qvec` is given), search (vector or hybrid), aggregate, rerank; returns (qvec, results)."""
+        # With a reranker, over-fetch and let it pick the final k.
+        fetch = k * self.settings.rerank_fanout if self.reranker else k
+        limit = fetch * self.settings.chunk_fanout if self.settings.index_mode == "chunked" else fetch
+
+        lexical = None
+        if self.lexical is not None:
+            lexical = self._pool.submit(self.lexical.search, question, limit, filters)
+        if qvec is None:
+            with trace.stage("embed"):
+                qvec = self.embedder.embed_query(question)
+        with trace.stage("search"):
+            results = self.db.search(qvec, k=limit, filters=filters)
+            scanned = getattr(results, "scanned", None)
+            # Nothing close enough: skip fusion, reranking and the LLM call altogether.
+            trace.set(best_distance=best_distance(results))
+            if not is_relevant(results, self.settings.relevance_max_distance):
+                trace.set(gated=True, vectors_searched=scanned)
+                return qvec, SearchResults(objects=[])
+            if lexical is not None:
+                results = fuse_results(results, lexical.result(), limit)
+            if self.settings.index_mode == "chunked":
+                results = aggregate_sections(results, top_recipes=fetch)
+        trace.set(vectors_searched=scanned, search_limit=limit)
+
+        if self.reranker is not None and len(results.objects) > 1:
+            with trace.stage("rerank"):
+                by_id = {obj.properties["note_id"]: obj for obj in results.objects}
+                candidates = [
+                    {"note_id": note_id, "text": f"{obj.properties['title']}\n{obj.properties['content']}"}
+                    for note_id, obj in by_id.items()
+                ]
+                ranked = self.reranker.rerank(question, candidates)
+                results = SearchResults(objects=[by_id[note_id] for note_id in ranked[:k]])
+
+        trace.set(
+            note_ids=list(self._note_ids(results)),
+            distances=[obj.metadata.distance for obj in results.objects],
+        )
+        return qvec, results
+
+    @staticmethod
+    def _note_ids(results) -> Tuple[str, ...]:
+        return tuple(obj.properties["note_id"] for obj in results.objects)
+
+    def _cache_exact(self, key: str) -> Optional[Tuple[str, str]]:
+        return self.answer_cache.get_exact(key) if self.answer_cache else None
+
+    def _cache_similar(self, qvec, results) -> Optional[Tuple[str, str]]:
+        return self.answer_cache.get_similar(qvec, self._note_ids(results)) if self.answer_cache else None
+
+    def _cache_missed(self) -> None:
+        if self.answer_cache is not None:
+            self.answer_cache.record_miss()
+
+    def _remember(self, key: str, qvec, results, answer: str, context: str) -> None:
+        if self.answer_cache is not None:
+            self.answer_cache.put(key, qvec, self._note_ids(results), answer, context)
+
+    def answer(
+        self,
+        question: str,
+        k: int = 3,
+        filters: Optional[Sequence[MetadataFilter]] = None,
+        trace: Optional[Trace] = None,
+        qvec: Optional[List[float]] = None,
+    ) -> Tuple[str, str]:
+        """`qvec` is the question's embedding when the caller has already computed it (batch mode)."""
+        trace = trace or Trace(question)
+        try:
+            return self._answer(question, k, filters, trace, qvec)
+        finally:
+            self.tracer.finish(trace)
+
+    def _answer(
+        self,
+        question: str,
+        k: int,
+        filters: Optional[Sequence[MetadataFilter]],
+        trace: Trace,
+        qvec: Optional[List[float]] = None,
+    ) -> Tuple[str, str]:
+        key = AnswerCache.make_key(question, k, tuple(filters or ()))
+        hit = self._cache_exact(key)
+        if hit:
+            trace.set(cache="exact")
+            return hit
+
+        qvec, results = self._retrieve(question, k, filters, trace, qvec)
+        if not results.objects:
+            self._cache_missed()
+            return NO_ANSWER, ""
+        hit = self._cache_similar(qvec, results)
+        if hit:
+            trace.set(cache="semantic")
+            return hit
+        self._cache_missed()
+
+        context = self._traced_context(results, trace)
+        if not context.sections:  # nothing fit the token budget: don't ask the LLM blind
+            return NO_ANSWER, ""
+        with trace.stage("llm"):
+            answer = self.llm.rag_answer(context=context, question=question, trace=trace)
+        self._remember(key, qvec, results, answer, context.text)
+        return answer, context.text
+
+    def _traced_context(self, results, trace: Trace) -> PackedContext:
+        with trace.stage("context"):
+            context = self._build_context(results)
+        trace.set(context_tokens=context.tokens, context_chars=len(context.text), context_sections=context.sections)
+        return context
+
+    def _finish_when_streamed(
+        self, stream: StreamedAnswer, trace: Trace, llm_started: Optional[float] = None, then=None
+    ) -> StreamedAnswer:
+        def on_complete(text: str) -> None:
+            if then is not None:
+                then(text)
+            if llm_started is not None:
+                trace.stages["llm"] = time.perf_counter() - llm_started
+            trace.set(ttft_s=stream.ttft)
+            self.tracer.finish(trace)
+
+        stream.on_complete = on_complete
+        return stream
+
+    def answer_stream(
+        self,
+        question: str,
+        k: int = 3,
+        filters: Optional[Sequence[MetadataFilter]] = None,
+        trace: Optional[Trace] = None,
+    ) -> Tuple[StreamedAnswer, str]:
+        """
+        Like answer(), but tokens are yielded as they arrive; ttft includes retrieval time.
+        The trace is finished once the stream has been consumed.
+        """
+        trace = trace or Trace(question)
+        started = trace.started
+        key = AnswerCache.make_key(question, k, tuple(filters or ()))
+        hit = self._cache_exact(key)
+        if hit:
+            trace.set(cache="exact")
+            return self._finish_when_streamed(StreamedAnswer([hit[0]], started=started), trace), hit[1]
 
-    def answer(self, question: str, k: int = 3) -> Tuple[str, str]:
-        qvec = self.embedder.embed_query(question)
-        results = self.db.search(qvec, k=k)
+        qvec, results = self._retrieve(question, k, filters, trace)
         if not results.objects:
-            return "I do not know based on the provided context.", ""
+            self._cache_missed()
+            return self._finish_when_streamed(StreamedAnswer([NO_ANSWER], started=started), trace), ""
+        hit = self._cache_similar(qvec, results)
+        if hit:
+            trace.set(cache="semantic")
+            return self._finish_when_streamed(StreamedAnswer([hit[0]], started=started), trace), hit[1]
+        self._cache_missed()
 
-        context = self._format_context(results)
-        answer = self.llm.rag_answer(context=context, question=question)
-        return answer, context
+        context = self._traced_context(results, trace)
+        if not context.sections:
+            return self._finish_when_streamed(StreamedAnswer([NO_ANSWER], started=started), trace), ""
+        llm_started = time.perf_counter()
+        stream = self.llm.rag_answer_stream(context=context, question=question, started=started, trace=trace)
+        remember = lambda text: self._remember(key, qvec, results, text, context.text)
+        return self._finish_when_streamed(stream, trace, llm_started, then=remember), context.text
@@ -1,15 +1,39 @@
+import hashlib
 import json
+from dataclasses import asdict
 from pathlib import Path
-from typing import List
+from typing import Iterator, List
 from .models import Recipe
 
-def load_recipes(path: str) -> List[Recipe]:
+def _recipe(obj: dict) -> Recipe:
+    return Recipe(
+        id=obj["id"],
+        title=obj["title"],
+        content=obj["content"],
+        tags=tuple(obj.get("tags", ())),
+        protein_source=obj.get("protein_source", ""),
+        meal_type=tuple(obj.get("meal_type", ())),
+    )
+
+def iter_recipes(path: str) -> Iterator[Recipe]:
+    """Yield recipes from a JSON array, or lazily line by line from a .jsonl file."""
     p = Path(path)
     if not p.exists():
         raise FileNotFoundError(f"recipes.json not found at: {p.resolve()}")
 
-    data = json.loads(p.read_text(encoding="utf-8"))
-    recipes: List[Recipe] = []
-    for obj in data:
-        recipes.append(Recipe(id=obj["id"], title=obj["title"], content=obj["content"]))
-    return recipes
+    if p.suffix == ".jsonl":
+        with p.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield _recipe(json.loads(line))
+        return
+    for obj in json.loads(p.read_text(encoding="utf-8")):
+        yield _recipe(obj)
+
+def load_recipes(path: str) -> List[Recipe]:
+    return list(iter_recipes(path))
+
+def recipe_hash(recipe: Recipe) -> str:
+    """Stable fingerprint of everything we index for a recipe."""
+    payload = json.dumps(asdict(recipe), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,41 @@
+import math
+from dataclasses import dataclass
+from typing import Optional, Sequence
+from .models import SearchResults
+
+def best_distance(results: SearchResults) -> Optional[float]:
+    """Smallest cosine distance among the hits, or None when the backend returned none."""
+    distances = [obj.metadata.distance for obj in results.objects if obj.metadata.distance is not None]
+    return min(distances) if distances else None
+
+def is_relevant(results: SearchResults, max_distance: float) -> bool:
+    """False only when distances are known and even the best hit is farther than max_distance (0 disables)."""
+    best = best_distance(results)
+    return max_distance <= 0 or best is None or best <= max_distance
+
+@dataclass(frozen=True)
+class Calibration:
+    threshold: float
+    on_topic_kept: float
+    off_topic_rejected: float
+
+def calibrate_threshold(
+    on_topic: Sequence[float], off_topic: Sequence[float], min_recall: float = 1.0
+) -> Calibration:
+    """
+    Pick RELEVANCE_MAX_DISTANCE from best-hit distances of on-topic and off-topic queries.
+
+    The cutoff keeps at least `min_recall` of the on-topic queries, then moves halfway
+    towards the nearest off-topic distance so small embedding drift doesn't flip answers.
+    """
+    if not on_topic:
+        raise ValueError("Calibration needs at least one on-topic distance")
+    on, off = sorted(on_topic), sorted(off_topic)
+    floor = on[max(0, math.ceil(min_recall * len(on)) - 1)]
+    above = [d for d in off if d > floor]
+    threshold = (floor + above[0]) / 2 if above else floor
+    return Calibration(
+        threshold=threshold,
+        on_topic_kept=sum(d <= threshold for d in on) / len(on),
+        off_topic_rejected=sum(d > threshold for d in off) / len(off) if off else 0.0,
+    )
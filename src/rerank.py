@@ -0,0 +1,71 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Protocol
+from .lexical import bm25_scores, tokenize
+
+DEFAULT_CROSS_ENCODER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+class Reranker(Protocol):
+    def rerank(self, question: str, candidates: List[Dict]) -> List[str]:
+        """
+        candidates: list of {"note_id": str, "text": str}, in first-stage retrieval order
+        returns: ordered list of note_ids
+        """
+        ...
+
+@dataclass
+class Bm25Reranker:
+    """
+    Feature scorer: BM25 over the candidate texts (normalized to [0, 1]) plus a small prior
+    for the first-stage position, so exact keyword/number matches move up while the dense
+    ranking still breaks ties and carries queries with no lexical overlap.
+    """
+    prior_weight: float = 0.3
+
+    def rerank(self, question: str, candidates: List[Dict]) -> List[str]:
+        n = len(candidates)
+        scores = bm25_scores(tokenize(question), [tokenize(c["text"]) for c in candidates])
+        top = max(scores, default=0.0) or 1.0
+        final = [s / top + self.prior_weight * (1 - i / n) for i, s in enumerate(scores)]
+        order = sorted(range(n), key=lambda i: -final[i])
+        return [candidates[i]["note_id"] for i in order]
+
+# Loaded cross-encoders, shared by every reranker in the process.
+_CROSS_ENCODERS: Dict[str, Any] = {}
+_CROSS_ENCODERS_LOCK = threading.Lock()
+
+@dataclass
+class CrossEncoderReranker:
+    """Scores all (question, candidate) pairs with a local CPU cross-encoder in one batch."""
+    model: str = DEFAULT_CROSS_ENCODER
+    batch_size: int = 32
+
+    def __post_init__(self) -> None:
+        with _CROSS_ENCODERS_LOCK:
+            if self.model not in _CROSS_ENCODERS:
+                from sentence_transformers import CrossEncoder
+                _CROSS_ENCODERS[self.model] = CrossEncoder(self.model, device="cpu")
+            self._encoder = _CROSS_ENCODERS[self.model]
+
+    def rerank(self, question: str, candidates: List[Dict]) -> List[str]:
+        if not candidates:
+            return []
+        scores = self._encoder.predict(
+            [(question, c["text"]) for c in candidates],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+        )
+        order = sorted(range(len(candidates)), key=lambda i: -float(scores[i]))
+        return [candidates[i]["note_id"] for i in order]
+
+def make_reranker(spec: str) -> Optional[Reranker]:
+    """'none' | 'bm25' | 'cross-encoder' | 'cross-encoder:<model name>'"""
+    if not spec or spec == "none":
+        return None
+    if spec == "bm25":
+        return Bm25Reranker()
+    if spec == "cross-encoder":
+        return CrossEncoderReranker()
+    if spec.startswith("cross-encoder:"):
+        return CrossEncoderReranker(spec.split(":", 1)[1])
+    raise ValueError(f"Unknown reranker: {spec!r}")
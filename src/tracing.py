@@ -0,0 +1,123 @@
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Protocol, Sequence
+
+@dataclass
+class Trace:
+    """Per-question record: wall time per stage (seconds) plus free-form attributes."""
+    question: str
+    stages: Dict[str, float] = field(default_factory=dict)
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    started: float = field(default_factory=time.perf_counter)
+    total: float = 0.0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - t0
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {"question": self.question, "total_s": self.total, "stages_s": self.stages, **self.attrs}
+
+    def summary(self) -> str:
+        parts = [f"{name} {secs * 1000:.1f} ms" for name, secs in self.stages.items()]
+        parts.append(f"total {self.total * 1000:.1f} ms")
+        lines = [" | ".join(parts)]
+        details = {k: v for k, v in self.attrs.items() if v is not None}
+        if details:
+            lines.append(", ".join(f"{k}={_fmt(v)}" for k, v in details.items()))
+        return "\n".join(lines)
+
+def _fmt(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_fmt(v) for v in value) + "]"
+    return str(value)
+
+class TraceSink(Protocol):
+    def record(self, trace: Trace) -> None:
+        ...
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class HistogramSink:
+    """Keeps every stage timing in memory and reports p50/p95/p99."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = defaultdict(list)
+
+    def record(self, trace: Trace) -> None:
+        with self._lock:
+            for name, secs in trace.stages.items():
+                self._samples[name].append(secs)
+            self._samples["total"].append(trace.total)
+
+    def percentiles(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+        return {
+            name: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "sum": sum(values),
+            }
+            for name, values in samples.items()
+        }
+
+    def prometheus_text(self, metric: str = "rag_stage_seconds") -> str:
+        """Prometheus text exposition (summary type) of the collected timings."""
+        lines = [f"# HELP {metric} Wall time per RagApp.answer stage.", f"# TYPE {metric} summary"]
+        for name, stats in self.percentiles().items():
+            for q in ("p50", "p95", "p99"):
+                quantile = int(q[1:]) / 100
+                lines.append(f'{metric}{{stage="{name}",quantile="{quantile}"}} {stats[q]:.6f}')
+            lines.append(f'{metric}_sum{{stage="{name}"}} {stats["sum"]:.6f}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(self.prometheus_text(), encoding="utf-8")
+
+class JsonlSink:
+    """Appends one JSON object per finished trace."""
+
+    def __init__(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, trace: Trace) -> None:
+        line = json.dumps(trace.to_dict(), ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+class Tracer:
+    def __init__(self, sinks: Sequence[TraceSink] = ()) -> None:
+        self.sinks = list(sinks)
+
+    def finish(self, trace: Trace) -> None:
+        trace.total = time.perf_counter() - trace.started
+        for sink in self.sinks:
+            sink.record(trace)
@@ -1,48 +1,170 @@
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence
 import weaviate
-from weaviate.classes.config import Property, DataType, Configure
+from weaviate.classes.config import Property, DataType, Configure, Tokenization
+from weaviate.classes.query import Filter, MetadataQuery
+from weaviate.collections.classes.config import BQConfig, PQConfig, SQConfig
+from weaviate.util import generate_uuid5
+from .filters import MetadataFilter, to_weaviate
+from .models import object_key
+
+# VECTOR_QUANTIZATION values Weaviate compresses natively; BQ and SQ re-score with the original vectors.
+QUANTIZERS = {
+    "pq": Configure.VectorIndex.Quantizer.pq,
+    "bq": Configure.VectorIndex.Quantizer.bq,
+    "sq": Configure.VectorIndex.Quantizer.sq,
+}
+
+def collection_quantizer(collection) -> str:
+    """The QUANTIZERS name an existing collection's vector index was created with, or "none"."""
+    config = collection.config.get()
+    named = config.vector_config
+    index = next(iter(named.values())).vector_index_config if named else config.vector_index_config
+    quantizer = getattr(index, "quantizer", None)
+    for name, kind in (("pq", PQConfig), ("bq", BQConfig), ("sq", SQConfig)):
+        if isinstance(quantizer, kind):
+            return name
+    return "none"
+
+def near_vector_many(collection, vectors: List[List[float]], limit: int, max_workers: int = 8, **kwargs) -> list:
+    """Run near_vector for each vector with several gRPC calls in flight; results keep input order."""
+    if not vectors:
+        return []
+
+    def search(vector):
+        return collection.query.near_vector(near_vector=vector, limit=limit, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(vectors))) as pool:
+        return list(pool.map(search, vectors))
 
 class VectorDb:
-    def __init__(self, host: str, http_port: int, grpc_port: int, collection_name: str) -> None:
+    def __init__(
+        self,
+        host: str,
+        http_port: int,
+        grpc_port: int,
+        collection_name: str,
+        recreate: bool = True,
+        batch_size: int = 16,
+        concurrent_requests: int = 2,
+        quantizer: str = "none",
+    ) -> None:
+        if quantizer != "none" and quantizer not in QUANTIZERS:
+            raise ValueError(f"Unknown Weaviate quantizer: {quantizer!r}")
         self.collection_name = collection_name
+        self.quantizer = quantizer
+        self.batch_size = batch_size
+        self.concurrent_requests = concurrent_requests
         self.client = weaviate.connect_to_local(host=host, port=http_port, grpc_port=grpc_port)
         if not self.client.is_ready():
             raise RuntimeError("Weaviate is not ready. Is Docker running?")
 
-        self.collection = self._ensure_collection()
+        self.collection = self._ensure_collection(recreate)
 
     def close(self) -> None:
         self.client.close()
 
-    def _ensure_collection(self):
+    def flush(self) -> None:
+        # Batches are committed when their context manager exits; nothing is buffered here.
+        pass
+
+    @staticmethod
+    def _properties() -> List[Property]:
+        return [
+            # Matched exactly by delete_notes; word tokenization would let "chicken-soup-1" hit "chicken-2".
+            Property(name="note_id", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+            Property(name="title", data_type=DataType.TEXT),
+            Property(name="content", data_type=DataType.TEXT),
+            Property(name="content_hash", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+            # Set only in chunked indexing mode ("ingredients" / "instructions").
+            Property(name="section", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+            # Metadata used for pre-filtering; field tokenization keeps values exact.
+            Property(name="tags", data_type=DataType.TEXT_ARRAY, tokenization=Tokenization.FIELD),
+            Property(name="protein_source", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+            Property(name="meal_type", data_type=DataType.TEXT_ARRAY, tokenization=Tokenization.FIELD),
+        ]
+
+    @classmethod
+    def _tokenization_matches(cls, existing: Dict[str, object]) -> bool:
+        for prop in cls._properties():
+            current = existing.get(prop.name)
+            if current is not None and prop.tokenization is not None and current.tokenization != prop.tokenization:
+                return False
+        return True
+
+    def _ensure_collection(self, recreate: bool):
         if self.client.collections.exists(self.collection_name):
+            collection = self.client.collections.get(self.collection_name)
+            existing = {p.name: p for p in collection.config.get().properties}
+            # Tokenization can't be changed in place: an older word-tokenized note_id takes a rebuild.
+            if not recreate and self._tokenization_matches(existing):
+                # Collections created by older versions may lack newer properties.
+                for prop in self._properties():
+                    if prop.name not in existing:
+                        collection.config.add_property(prop)
+                return collection
             self.client.collections.delete(self.collection_name)
 
+        # The quantizer is part of the index config, so changing it takes a rebuild.
+        quantizer = QUANTIZERS[self.quantizer]() if self.quantizer in QUANTIZERS else None
         return self.client.collections.create(
             name=self.collection_name,
-            properties=[
-                Property(name="note_id", data_type=DataType.TEXT),
-                Property(name="title", data_type=DataType.TEXT),
-                Property(name="content", data_type=DataType.TEXT),
-            ],
-            vector_config=Configure.Vectors.self_provided(),
+            properties=self._properties(),
+            vector_config=Configure.Vectors.self_provided(quantizer=quantizer),
         )
 
     def is_empty(self) -> bool:
         info = self.collection.aggregate.over_all(total_count=True)
         return info.total_count == 0
 
+    def note_hashes(self) -> Dict[str, str]:
+        """Return {note_id: content_hash} for everything currently stored."""
+        hashes: Dict[str, str] = {}
+        for obj in self.collection.iterator(return_properties=["note_id", "content_hash"]):
+            p = obj.properties
+            hashes[p["note_id"]] = p.get("content_hash") or ""
+        return hashes
+
+    def delete_notes(self, note_ids: Iterable[str]) -> None:
+        ids = list(note_ids)
+        # Keep each filter well below Weaviate's per-request delete limit.
+        for i in range(0, len(ids), 500):
+            self.collection.data.delete_many(
+                where=Filter.by_property("note_id").contains_any(ids[i : i + 500])
+            )
+
     def insert(self, notes: List[dict], vectors: List[List[float]]) -> None:
-        with self.collection.batch.fixed_size(batch_size=16) as batch:
+        batching = self.collection.batch.fixed_size(
+            batch_size=self.batch_size, concurrent_requests=self.concurrent_requests
+        )
+        with batching as batch:
             for rec, vec in zip(notes, vectors):
                 batch.add_object(
                     properties={
                         "note_id": rec["note_id"],
                         "title": rec["title"],
                         "content": rec["content"],
+                        "content_hash": rec.get("content_hash", ""),
+                        "section": rec.get("section", ""),
+                        "tags": list(rec.get("tags", [])),
+                        "protein_source": rec.get("protein_source", ""),
+                        "meal_type": list(rec.get("meal_type", [])),
                     },
                     vector=vec,
+                    uuid=generate_uuid5(object_key(rec)),
                 )
+        # Raise so callers (e.g. the ingest checkpoint) never count a partial batch as committed.
+        if self.collection.batch.failed_objects:
+            raise RuntimeError(f"{len(self.collection.batch.failed_objects)} objects failed to insert")
 
-    def search(self, vector: List[float], k: int):
-        return self.collection.query.near_vector(near_vector=vector, limit=k)
+    def search(self, vector: List[float], k: int, filters: Optional[Sequence[MetadataFilter]] = None):
+        return self.collection.query.near_vector(
+            near_vector=vector, limit=k, filters=to_weaviate(filters), return_metadata=MetadataQuery(distance=True)
+        )
+
+    def search_many(
+        self, vectors: List[List[float]], k: int, filters: Optional[Sequence[MetadataFilter]] = None
+    ) -> list:
+        return near_vector_many(
+            self.collection, vectors, limit=k, filters=to_weaviate(filters), return_metadata=MetadataQuery(distance=True)
+        )
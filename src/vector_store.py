@@ -0,0 +1,53 @@
+from .config import Settings
+
+LOCAL_DTYPES = {"float16", "int8"}
+WEAVIATE_QUANTIZERS = {"pq", "bq", "sq"}
+
+def open_vector_db(settings: Settings, recreate: bool):
+    """
+    Build the vector backend selected by Settings.vector_backend, two-stage if MATRYOSHKA_DIMS
+    is set or a quantized local index is re-scored against full-precision vectors.
+    """
+    collection_name = settings.chunk_collection_name if settings.index_mode == "chunked" else settings.collection_name
+    dims = settings.matryoshka_dims
+    rescore_quantized = (
+        settings.vector_backend == "local"
+        and settings.vector_quantization in LOCAL_DTYPES
+        and settings.quantization_rescore > 0
+    )
+    if not dims and not rescore_quantized:
+        return _open_backend(settings, collection_name, recreate)
+
+    from .local_vector_db import LocalVectorDb
+    from .matryoshka import MatryoshkaVectorDb
+    # The truncated index gets its own collection so it never mixes with full-size vectors.
+    coarse = _open_backend(settings, f"{collection_name}D{dims}" if dims else collection_name, recreate)
+    full = LocalVectorDb(settings.local_index_dir or None, f"{collection_name}Full", recreate=recreate)
+    rescore = settings.matryoshka_rescore if dims else settings.quantization_rescore
+    return MatryoshkaVectorDb(coarse, full, dims, rescore=rescore)
+
+def _open_backend(settings: Settings, collection_name: str, recreate: bool):
+    quantization = settings.vector_quantization
+    if settings.vector_backend == "local":
+        from .local_vector_db import LocalVectorDb
+        if quantization != "none" and quantization not in LOCAL_DTYPES:
+            raise ValueError(f"VECTOR_QUANTIZATION={quantization!r} is not supported by the local backend")
+        dtype = quantization if quantization in LOCAL_DTYPES else "float32"
+        return LocalVectorDb(settings.local_index_dir or None, collection_name, recreate=recreate, dtype=dtype)
+
+    if settings.vector_backend == "weaviate":
+        from .vector_db import VectorDb
+        if quantization != "none" and quantization not in WEAVIATE_QUANTIZERS:
+            raise ValueError(f"VECTOR_QUANTIZATION={quantization!r} is not supported by the Weaviate backend")
+        return VectorDb(
+            host=settings.weaviate_host,
+            http_port=settings.weaviate_http_port,
+            grpc_port=settings.weaviate_grpc_port,
+            collection_name=collection_name,
+            recreate=recreate,
+            batch_size=settings.weaviate_batch_size,
+            concurrent_requests=settings.weaviate_concurrent_requests,
+            quantizer=quantization,
+        )
+
+    raise ValueError(f"Unknown VECTOR_BACKEND: {settings.vector_backend!r}")